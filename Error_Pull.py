@@ -1,51 +1,52 @@
+from collections import deque
 import streamlit as st
 import pandas as pd
-import aiohttp
-import asyncio
-from sodapy import Socrata
-from io import StringIO, BytesIO
-from datetime import datetime
+from analytics_panel import analytics_panel
+from app_memo import forget_results, recall_results, remember_results, results_key
+from exporters import export_formats, export_to_tempfile
+from lineage import describe_rollup, resolve_lineage
+from catalog_mirror import CatalogMirror, sync_catalog
+from metadata_cache import MetadataCache
+from metadata_pipeline import (
+    MetadataFetcher, build_dataset_info, metadata_sources, process_reports, results_frame, use_metadata_source
+)
+from report_index import ReportSource
+from run_history import RunHistory
+from socrata_client import FetchError
+from telemetry import Telemetry, profiled
 
 # Define your API app token
 app_token = "YourAPIkey "
-client = Socrata("data.wa.gov", app_token)
-
-async def fetch(session, url):
-    async with session.get(url) as response:
-        return await response.json()
-
-def format_date(date_str):
-    # Convert timestamp to readable date format if necessary
-    try:
-        date = datetime.utcfromtimestamp(int(date_str))
-        return date.strftime('%Y-%m-%d %H:%M:%S')
-    except (ValueError, TypeError):
-        return date_str
-
-async def fetch_dataset_info(url, error):
-    async with aiohttp.ClientSession() as session:
-        data = await fetch(session, url)
-
-        created_at = format_date(data.get("createdAt", "N/A"))
-        updated_at = format_date(data.get("indexUpdatedAt", created_at))  # Use created_at if dataUpdatedAt is missing
-
-        dataset_info = {
-            "Unique ID": data.get("id", "N/A"),
-            "Dataset Name": data.get("name", "N/A"),
-            "Type": data.get("assetType", "N/A"),
-            "Initial Upload Date": created_at,
-            "Last Update": updated_at,
-            "Dataset Owner": data.get("owner", {}).get("displayName", "N/A"),
-            "Derived View": data.get("viewType", "N/A"),
-            "Parent UID": data.get("parentUid", "N/A"),
-            "Dataset link": f"https://data.wa.gov/api/views/metadata/v1/{data.get('id', '')}",
-            "error": error
-        }
-        return dataset_info
-
-async def fetch_all_datasets(urls_with_errors):
-    tasks = [fetch_dataset_info(url, error) for url, error in urls_with_errors]
-    return await asyncio.gather(*tasks)
+
+# Connection pool settings for metadata requests
+pool_size = 20  # Max open connections per Socrata host
+max_concurrency = 20  # Max metadata requests in flight per host
+use_bulk_lookup = True  # Resolve IDs in batches via /api/views.json, per-ID GETs only for misses
+bulk_chunk_size = 100  # IDs per batch request
+profile_runs = None  # "cprofile" or "pyinstrument" to profile each fetch (shown under Run diagnostics)
+live_table_rows = 200  # Newest rows shown while a fetch runs; the full table follows once it is done
+
+# Local metadata cache shared across reruns
+@st.cache_resource
+def get_metadata_cache():
+    return MetadataCache()
+
+metadata_cache = get_metadata_cache()
+fetcher = MetadataFetcher(
+    app_token,
+    metadata_cache,
+    pool_size=pool_size,
+    max_concurrency=max_concurrency,
+    use_bulk_lookup=use_bulk_lookup,
+    bulk_chunk_size=bulk_chunk_size
+)
+
+# Local run history, so daily reports only fetch what changed since the last run
+@st.cache_resource
+def get_run_history():
+    return RunHistory()
+
+run_history = get_run_history()
 
 st.title("Dataset Info Extractor")
 
@@ -69,41 +70,186 @@ st.markdown(
 )
 
 
-uploaded_file = st.file_uploader("Upload a TXT file", type="txt")
-
-if uploaded_file is not None:
-    content = StringIO(uploaded_file.getvalue().decode("utf-8"))
-    lines = content.readlines()
-
-    urls_with_errors = []
-    for line in lines:
-        if "Identifier:" in line:
-            url_start = line.find("Identifier:") + len("Identifier:")
-            url_end = line.find("; Title:")
-            if url_start != -1 and url_end != -1:
-                url = line[url_start:url_end].strip()
-                error_start = line.find("Found.") + len("Found.")
-                error = line[error_start:].strip()
-                urls_with_errors.append((url, error))
-
-    if urls_with_errors:
-        with st.spinner("Fetching dataset information..."):
-            dataset_infos = asyncio.run(fetch_all_datasets(urls_with_errors))
+# Local copy of the portal catalog: lookups it can answer never touch the network
+@st.cache_resource
+def get_catalog_mirror():
+    return CatalogMirror()
+
+catalog_mirror = get_catalog_mirror()
+mirror_domains = ["data.wa.gov"]
+
+with st.expander("Local catalog mirror"):
+    mirror_status = catalog_mirror.status()
+    if mirror_status:
+        st.dataframe(pd.DataFrame(mirror_status))
+    if st.button("Sync catalog"):
+        for domain in mirror_domains:
+            try:
+                with st.spinner(f"Syncing the {domain} catalog..."):
+                    counts = sync_catalog(fetcher, catalog_mirror, domain)
+            except FetchError as e:
+                st.error(f"{domain}: the catalog could not be synced: {e}")
+                continue
+            incomplete = "" if counts["complete"] else " Nothing was removed: the listing was incomplete."
+            st.success(f"{domain}: {counts['assets']} assets, {counts['fetched']} fetched, "
+                       f"{counts['removed']} removed.{incomplete}")
+    mirror_query = st.text_input("Search the mirror by name or owner")
+    if mirror_query:
+        matches = [
+            build_dataset_info(view, None, domain)
+            for domain in mirror_domains
+            for view in catalog_mirror.search(domain, mirror_query)
+        ]
+        st.dataframe(results_frame(matches) if matches else pd.DataFrame())
+
+uploaded_files = st.file_uploader("Upload TXT files", type="txt", accept_multiple_files=True)
+
+if uploaded_files:
+    full_refresh = st.checkbox("Full refresh (refetch datasets unchanged since the last run)")
+    metadata_source = st.selectbox("Metadata source", list(metadata_sources), format_func=metadata_sources.get)
+
+    # Reuse these uploads' results on reruns (checkbox clicks etc.); refetch on demand
+    run_key = results_key(uploaded_files, "data.wa.gov", use_bulk_lookup, full_refresh, metadata_source)
+    # Refreshing also skips the run history and revalidates cached metadata, so nothing stale comes back
+    refresh = st.button("Refresh metadata")
+    if refresh:
+        forget_results(run_key)
+
+    run = recall_results(run_key)
+    if run is None:
+        # Stream the uploads into the fetch, merging repeated datasets so each is fetched once.
+        # Several large uploads are parsed in parallel worker processes while the first streams.
+        telemetry = Telemetry()
+        sources = [
+            ReportSource(uploaded_file.name, uploaded_file, "data.wa.gov")
+            for uploaded_file in uploaded_files
+        ]
+
+        # Rows show up in the live table as soon as their batch is fetched. Only the newest
+        # are kept, so each refresh costs the same however far into the report the fetch is.
+        progress_bar = st.progress(0.0, text="Fetching dataset information...")
+        live_table = st.empty()
+        live_rows = deque(maxlen=live_table_rows)
+
+        def show_batch(rows, done, parsed, parsing_done):
+            live_rows.extend(rows)
+            label = f"Fetched {done} of {parsed} datasets (the newest {len(live_rows)} are shown)"
+            progress_bar.progress(min(done / max(parsed, 1), 1.0), text=label)
+            if rows:
+                with telemetry.span("render: live table"):
+                    live_table.dataframe(results_frame(list(live_rows)))
+
+        # Only datasets that are new or changed since the last run are fetched
+        fetcher.telemetry = telemetry
+        with profiled(profile_runs) as profile:
+            report_run = process_reports(
+                fetcher, sources, run_history, full_refresh or refresh, metadata_source, catalog_mirror, show_batch
+            )
+        progress_bar.empty()
+        live_table.empty()
+        run = remember_results(run_key, {
+            "dataset_infos": report_run.rows,
+            "analytics": report_run.analytics,
+            "parse_stats": report_run.parse_stats,
+            "cache_stats": report_run.cache_stats,
+            "delta": (report_run.delta.counts, report_run.delta.resolved),
+            "telemetry": telemetry,
+            "profile": profile["report"]
+        })
+    dataset_infos = run["dataset_infos"]
+    parse_stats = run["parse_stats"]
+    cache_hits, cache_revalidated, cache_misses = run["cache_stats"]
+    delta_counts, resolved = run["delta"]
+    telemetry = run["telemetry"]
+
+    if parse_stats["malformed"]:
+        shown = ", ".join(str(n) for n in parse_stats["malformed"][:10])
+        st.warning(f"{len(parse_stats['malformed'])} malformed line(s) in the report(s) (lines {shown}).")
+    if parse_stats["duplicates"]:
+        st.info(f"{parse_stats['duplicates']} repeated dataset line(s) merged; each dataset was fetched once.")
+
+    # What changed since the last run; unchanged datasets reuse the stored metadata
+    new_col, changed_col, unchanged_col, resolved_col = st.columns(4)
+    new_col.metric("New errors", delta_counts["new"])
+    changed_col.metric("Changed errors", delta_counts["changed"])
+    unchanged_col.metric("Unchanged", delta_counts["unchanged"])
+    resolved_col.metric("Resolved", delta_counts["resolved"])
+    if resolved:
+        with st.expander(f"Resolved since the last run ({len(resolved)})"):
+            st.dataframe(results_frame(resolved))
+    with st.expander("Error trend"):
+        trend = pd.DataFrame(run_history.trend())
+        if len(trend) > 1:
+            trend["Run"] = pd.to_datetime(trend["Run"], unit="s")
+            st.line_chart(trend.set_index("Run")[["Errors", "New", "Resolved"]])
+        else:
+            st.write("The trend shows up after a second run.")
+
+    if dataset_infos:
+        # Show how much the local metadata cache saved on this run
+        hits_col, revalidated_col, misses_col = st.columns(3)
+        hits_col.metric("Cache hits", cache_hits)
+        revalidated_col.metric("Revalidated (304)", cache_revalidated)
+        misses_col.metric("Cache misses", cache_misses)
 
         results = [info for info in dataset_infos if info is not None]
 
+        failed = [info for info in results if "Fetch error" in info]
+        if failed:
+            st.warning(f"Metadata lookup failed for {len(failed)} dataset(s); see the Fetch error column.")
+
         if results:
-            df = pd.DataFrame(results)
-            st.write(df)
-
-            excel_buffer = BytesIO()
-            with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-                df.to_excel(writer, index=False)
-            excel_buffer.seek(0)
-
-            st.download_button(
-                label="Download Excel File",
-                data=excel_buffer,
-                file_name="dataset_info.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+            # Error classes by owner, type and update age, aggregated once per run
+            with st.expander("Error analytics", expanded=True), telemetry.span("render: analytics"):
+                analytics_panel(run["analytics"], key=f"analytics_{abs(hash(run_key))}")
+
+            with telemetry.span("stage: results table"):
+                df = results_frame(results)
+            with telemetry.span("render: results table"):
+                st.write(df)
+
+            # Export in the chosen format; each format is written to disk once per run
+            export_format = st.selectbox("Download format", list(export_formats))
+            export_paths = run.setdefault("export_paths", {})
+            if export_format not in export_paths:
+                with telemetry.span("stage: export"):
+                    export_paths[export_format] = export_to_tempfile(df, export_format)
+            extension, mime, writer = export_formats[export_format]
+
+            with open(export_paths[export_format], "rb") as export_file:
+                st.download_button(
+                    label=f"Download {export_format} File",
+                    data=export_file,
+                    file_name=f"dataset_info{extension}",
+                    mime=mime
+                )
+
+            # Erroring derived views grouped by the root dataset they come from, so a
+            # broken parent shows up as one root cause instead of many separate errors
+            if st.button("Resolve parent lineage"):
+                fetcher.telemetry = telemetry
+                use_metadata_source(fetcher, metadata_source, catalog_mirror)
+                with st.spinner("Resolving parent datasets..."):
+                    graph = resolve_lineage(fetcher, results)
+                run["lineage"] = (graph.rollup(results), graph.view_lineage(results))
+            if "lineage" in run:
+                rollup, view_lineage = run["lineage"]
+                with st.expander(f"Lineage: {len(rollup)} root dataset(s) behind erroring views", expanded=True):
+                    for group in rollup[:5]:
+                        st.caption(describe_rollup(group))
+                    st.dataframe(pd.DataFrame(rollup))
+                    st.dataframe(pd.DataFrame(view_lineage))
+
+    # Where the time went: stage and request spans, counters and the optional profile
+    with st.expander("Run diagnostics"):
+        st.dataframe(pd.DataFrame(telemetry.summary()))
+        st.write("Counters:")
+        st.json(telemetry.as_dict()["counters"])
+        if run["profile"]:
+            st.code(run["profile"])
+        st.download_button(
+            label="Download diagnostics (JSON)",
+            data=telemetry.to_json(),
+            file_name="run_diagnostics.json",
+            mime="application/json"
+        )
@@ -0,0 +1,36 @@
+import pandas as pd
+import streamlit as st
+
+from error_analytics import dimensions
+from metadata_pipeline import results_frame
+
+# Error analytics dashboard over an ErrorAnalytics built once per run.
+# Each summary table is filtered by the other dimensions' selections (so
+# picking an owner shows that owner's error classes, ages and types) and
+# comes from the pre-aggregated cells, not from the results DataFrame. Only
+# the rows matching every selection are turned into a table, a page at most.
+
+drill_row_limit = 1000
+
+
+def analytics_panel(analytics, key):
+    filter_cols = st.columns(len(dimensions))
+    filters = {
+        dimension: column.multiselect(dimension, analytics.values(dimension), key=f"{key}_{dimension}")
+        for column, dimension in zip(filter_cols, dimensions)
+    }
+
+    summary_cols = st.columns(2)
+    for n, dimension in enumerate(dimensions):
+        others = {name: values for name, values in filters.items() if name != dimension}
+        summary_cols[n % 2].dataframe(pd.DataFrame(analytics.summary(dimension, others)))
+
+    matching = analytics.count(filters)
+    if any(filters.values()):
+        shown = min(matching, drill_row_limit)
+        more = f"; showing the first {shown}" if shown < matching else ""
+        st.caption(f"{matching} dataset(s) match the selection{more}")
+        rows = analytics.drill_down(filters, drill_row_limit)
+        st.dataframe(results_frame(rows) if rows else pd.DataFrame())
+    else:
+        st.caption(f"{matching} dataset(s). Pick error classes, owners, types or ages to list the matching datasets.")
@@ -0,0 +1,59 @@
+import hashlib
+import os
+
+import streamlit as st
+
+# Memoizes fetched results across Streamlit reruns.
+# Results are kept in session state keyed by the upload's content hash plus
+# the settings that affect the fetch (domain, ...), so widget interactions
+# such as ticking a checkbox reuse them instead of re-parsing and refetching.
+
+max_memoized_runs = 3  # Older results are dropped first
+hash_chunk_size = 1024 * 1024
+
+
+def upload_digest(uploaded_file):
+    # SHA-256 of the upload, computed once per uploaded file
+    digests = st.session_state.setdefault("upload_digests", {})
+    if uploaded_file.file_id not in digests:
+        digest = hashlib.sha256()
+        uploaded_file.seek(0)
+        for chunk in iter(lambda: uploaded_file.read(hash_chunk_size), b""):
+            digest.update(chunk)
+        uploaded_file.seek(0)
+        digests[uploaded_file.file_id] = digest.hexdigest()
+    return digests[uploaded_file.file_id]
+
+
+def results_key(uploaded_files, *settings):
+    return tuple(upload_digest(uploaded_file) for uploaded_file in uploaded_files) + settings
+
+
+def recall_results(key):
+    return st.session_state.setdefault("memoized_results", {}).get(key)
+
+
+def discard_files(results):
+    # Export files written for a run live on disk until the run is dropped
+    for path in results.get("export_paths", {}).values():
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def remember_results(key, results):
+    memo = st.session_state.setdefault("memoized_results", {})
+    forget_results(key)
+    memo[key] = results
+    while len(memo) > max_memoized_runs:
+        discard_files(memo.pop(next(iter(memo))))
+    return results
+
+
+def forget_results(key=None):
+    # Drops one memoized run, or all of them when key is None
+    memo = st.session_state.setdefault("memoized_results", {})
+    for dropped in list(memo) if key is None else [key]:
+        if dropped in memo:
+            discard_files(memo.pop(dropped))
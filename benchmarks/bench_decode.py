@@ -0,0 +1,112 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metadata_decode  # noqa: E402
+from metadata_decode import decode_body, decode_pool, decode_views  # noqa: E402
+from synthetic_reports import synthetic_view  # noqa: E402
+
+# Compares ways of decoding a /api/views.json batch body:
+#
+#   python benchmarks/bench_decode.py --views 100 --columns 40 --batches 50
+#
+# "stdlib json" is the old response.json() path (whole document kept);
+# "stdlib + project" and "orjson + project" keep only the ViewMetadata
+# projection. Reports wall time, peak Python memory while decoding and the
+# memory still held by the results. The last line shows the longest event
+# loop stall while batches are decoded inline and through decode_body.
+
+
+def synthetic_body(views, columns, seed=0):
+    # Real views carry a column list and other fields the pipeline never reads
+    documents = []
+    for n in range(seed, seed + views):
+        view = synthetic_view(n)
+        view["columns"] = [
+            {"id": c, "name": f"Column {c}", "fieldName": f"column_{c}", "dataTypeName": "text",
+             "description": "c" * 80, "position": c, "renderTypeName": "text", "format": {}}
+            for c in range(columns)
+        ]
+        view["metadata"] = {"custom_fields": {"Data Owner": {"Team": "x" * 40}}, "rowLabel": "row"}
+        documents.append(view)
+    return json.dumps(documents).encode()
+
+
+def measure(decode, bodies):
+    started = time.perf_counter()
+    [decode(body) for body in bodies]
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    kept = [decode(body) for body in bodies]
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return elapsed, peak, held
+
+
+async def longest_stall(bodies, offload):
+    # Largest gap between ticks of a 1 ms heartbeat while the batches are decoded
+    gaps = []
+    done = asyncio.Event()
+
+    async def heartbeat():
+        last = time.perf_counter()
+        while not done.is_set():
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+
+    ticker = asyncio.create_task(heartbeat())
+    await asyncio.sleep(0.01)
+    for body in bodies:
+        if offload:
+            await decode_body(body, decode_views)
+        else:
+            decode_views(body)
+            await asyncio.sleep(0)
+    done.set()
+    await ticker
+    return max(gaps)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark view body decoding.")
+    parser.add_argument("--views", type=int, default=100, help="Views per batch body")
+    parser.add_argument("--columns", type=int, default=40, help="Columns per view")
+    parser.add_argument("--batches", type=int, default=20, help="Batch bodies decoded per measurement")
+    args = parser.parse_args(argv)
+
+    bodies = [synthetic_body(args.views, args.columns, seed=n * args.views) for n in range(args.batches)]
+    print(f"{args.batches} bodies of {len(bodies[0]) / 1e6:.2f} MB, {args.views} views each")
+
+    orjson = metadata_decode.orjson
+    variants = [("stdlib json", json.loads)]
+    metadata_decode.orjson = None
+    variants.append(("stdlib + project", decode_views))
+    print(f"{'decoder':<20}{'seconds':>10}{'peak MB':>10}{'held MB':>10}")
+    for name, decode in variants:
+        elapsed, peak, held = measure(decode, bodies)
+        print(f"{name:<20}{elapsed:>10.3f}{peak / 1e6:>10.1f}{held / 1e6:>10.2f}")
+    metadata_decode.orjson = orjson
+    if orjson is not None:
+        elapsed, peak, held = measure(decode_views, bodies)
+        print(f"{'orjson + project':<20}{elapsed:>10.3f}{peak / 1e6:>10.1f}{held / 1e6:>10.2f}")
+    else:
+        print("orjson is not installed")
+
+    decode_pool().submit(decode_views, bodies[0]).result()  # Start the pool outside the measurement
+    inline = asyncio.run(longest_stall(bodies, offload=False))
+    offloaded = asyncio.run(longest_stall(bodies, offload=True))
+    print(f"Longest event loop stall: {inline * 1000:.1f} ms inline, {offloaded * 1000:.1f} ms via decode_body "
+          f"(offloaded from {metadata_decode.offload_min_bytes / 1e6:.2f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd  # noqa: E402
+
+from exporters import export_formats, export_to_path  # noqa: E402
+from metadata_decode import ViewMetadata  # noqa: E402
+from metadata_pipeline import build_dataset_info, results_frame  # noqa: E402
+from synthetic_reports import synthetic_view  # noqa: E402
+
+# Compares export formats on a synthetic results table:
+#
+#   python benchmarks/bench_export.py --rows 100000
+#
+# Reports wall time, peak Python memory (tracemalloc) and file size per
+# format, next to the old pd.ExcelWriter -> BytesIO download path.
+
+
+def synthetic_frame(rows, seed=0):
+    rng = random.Random(seed)
+    results = [
+        build_dataset_info(
+            ViewMetadata.from_view(synthetic_view(n)), f"Error {rng.randrange(20)}: something was found", "data.wa.gov"
+        )
+        for n in range(rows)
+    ]
+    return results_frame(results)
+
+
+def old_excel_download(df, path):
+    # What the apps used to do for every rerun
+    buffer = BytesIO()
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        df.assign(**{
+            column: df[column].dt.tz_localize(None)
+            for column in df.columns
+            if isinstance(df[column].dtype, pd.DatetimeTZDtype)
+        }).to_excel(writer, index=False, sheet_name="Datasets")
+    with open(path, "wb") as out:
+        out.write(buffer.getvalue())
+
+
+def measure(write, df, path):
+    # Timed and memory-traced in separate passes; tracemalloc slows the writers down a lot
+    started = time.perf_counter()
+    write(df, path)
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    write(df, path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, os.path.getsize(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare export formats on a synthetic results table.")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--skip-excel", action="store_true", help="Excel is by far the slowest format")
+    args = parser.parse_args(argv)
+
+    df = synthetic_frame(args.rows)
+    print(f"{args.rows} rows, {df.memory_usage(deep=True).sum() / 1e6:.1f} MB in memory")
+    print(f"{'format':<22}{'seconds':>10}{'peak MB':>10}{'file MB':>10}")
+
+    candidates = [(name, extension, None) for name, (extension, mime, writer) in export_formats.items()]
+    candidates.append(("Excel (old BytesIO)", ".xlsx", old_excel_download))
+    with tempfile.TemporaryDirectory() as directory:
+        for name, extension, write in candidates:
+            if args.skip_excel and name.startswith("Excel"):
+                continue
+            path = os.path.join(directory, f"export{extension}")
+            if write is None:
+                write = lambda df, path, name=name: export_to_path(df, path, name)
+            elapsed, peak, size = measure(write, df, path)
+            print(f"{name:<22}{elapsed:>10.2f}{peak / 1e6:>10.1f}{size / 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
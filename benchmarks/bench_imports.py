@@ -0,0 +1,104 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Cold start and rerun cost of each entry point, every one in a fresh interpreter:
+#
+#   python benchmarks/bench_imports.py --json before.json
+#   python benchmarks/bench_imports.py --compare before.json
+#
+# Apps are run headless with Streamlit's AppTest: the first run (cold start,
+# imports included) and the median of --reruns further runs, which is what
+# every widget interaction costs. The CLI is timed on its import. Also lists
+# which of the heavy optional dependencies each entry point loaded.
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+apps = ["Error_Pull.py", "Error_Pull_with_Auto_Update_V2.py", "Error_Pull_With_Auto_Update_V3.py"]
+modules = ["error_pull_cli"]
+heavy_modules = ["selenium", "webdriver_manager", "sodapy", "openpyxl", "pyarrow", "aiohttp", "pandas"]
+
+app_probe = """
+import json, statistics, sys, time
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file(sys.argv[1], default_timeout=120)
+started = time.perf_counter()
+app.run()
+cold = time.perf_counter() - started
+reruns = []
+for _ in range(int(sys.argv[2])):
+    started = time.perf_counter()
+    app.run()
+    reruns.append(time.perf_counter() - started)
+print(json.dumps({
+    "cold_s": cold,
+    "rerun_s": statistics.median(reruns) if reruns else None,
+    "loaded": [name for name in sys.argv[3].split(",") if name in sys.modules]
+}))
+"""
+
+module_probe = """
+import json, sys, time
+started = time.perf_counter()
+__import__(sys.argv[1])
+print(json.dumps({
+    "cold_s": time.perf_counter() - started,
+    "rerun_s": None,
+    "loaded": [name for name in sys.argv[3].split(",") if name in sys.modules]
+}))
+"""
+
+
+def probe(script, target, reruns, scratch):
+    # Runs in a scratch directory so the apps' SQLite files do not land in the repo
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+    output = subprocess.run(
+        [sys.executable, "-c", script, target, str(reruns), ",".join(heavy_modules)],
+        capture_output=True, text=True, check=True, cwd=scratch, env=env
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure entry point cold start and rerun time.")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per entry point (median is kept)")
+    parser.add_argument("--reruns", type=int, default=5, help="Reruns timed per app")
+    parser.add_argument("--json", help="Save the results to this file")
+    parser.add_argument("--compare", help="Results file of an earlier run to compare against")
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as saved:
+            baseline = json.load(saved)
+
+    results = {}
+    targets = [(app, app_probe, os.path.join(root, app)) for app in apps]
+    targets += [(module, module_probe, module) for module in modules]
+    print(f"{'entry point':<36}{'cold s':>8}{'rerun s':>9}{'vs base':>9}  heavy modules loaded")
+    with tempfile.TemporaryDirectory() as scratch:
+        for name, script, target in targets:
+            samples = [probe(script, target, args.reruns, scratch) for _ in range(args.repeat)]
+            reruns = [sample["rerun_s"] for sample in samples if sample["rerun_s"] is not None]
+            result = {
+                "cold_s": round(statistics.median(sample["cold_s"] for sample in samples), 3),
+                "rerun_s": round(statistics.median(reruns), 3) if reruns else None,
+                "loaded": samples[0]["loaded"]
+            }
+            results[name] = result
+            before = baseline.get(name, {}).get("cold_s")
+            change = f"{(result['cold_s'] - before) / before:+.0%}" if before else ""
+            rerun = f"{result['rerun_s']:.3f}" if result["rerun_s"] is not None else ""
+            print(f"{name:<36}{result['cold_s']:>8.3f}{rerun:>9}{change:>9}  {', '.join(result['loaded'])}")
+
+    if args.json:
+        with open(args.json, "w") as out:
+            json.dump(results, out, indent=2)
+        print(f"Saved results to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiohttp  # noqa: E402
+
+import socrata_client  # noqa: E402
+from catalog_mirror import CatalogMirror, sync_catalog  # noqa: E402
+from error_analytics import ErrorAnalytics, dimensions  # noqa: E402
+from metadata_cache import cache_key  # noqa: E402
+from exporters import export_formats, export_to_path  # noqa: E402
+from metadata_pipeline import MetadataFetcher, results_frame  # noqa: E402
+from mock_socrata import MockSocrata  # noqa: E402
+from report_index import ReportSource, build_index, parse_workers  # noqa: E402
+from synthetic_reports import write_report  # noqa: E402
+
+# End-to-end pipeline benchmark against a local mock Socrata server, fully offline:
+#
+#   python benchmarks/bench_pipeline.py --rows 20000 --throttle-rate 0.01 --json before.json
+#   python benchmarks/bench_pipeline.py --rows 20000 --throttle-rate 0.01 --compare before.json
+#
+# Times each stage (parse, per-ID fetch, bulk fetch, catalog sync, lookups from
+# the synced mirror without the network, error analytics, results table, exports)
+# and reports throughput, per-request p50/p99 latency and peak Python memory
+# (tracemalloc, measured in a second pass). --json saves the numbers with the
+# git revision; --compare prints the change against a saved run, so two
+# versions can be compared on the same machine.
+
+
+def percentile(samples, q):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def latency_trace(samples):
+    # aiohttp trace hooks recording every request's time to response headers
+    trace = aiohttp.TraceConfig()
+
+    async def on_start(session, context, params):
+        context.started = time.perf_counter()
+
+    async def on_end(session, context, params):
+        samples.append(time.perf_counter() - context.started)
+
+    trace.on_request_start.append(on_start)
+    trace.on_request_end.append(on_end)
+    trace.on_request_exception.append(on_end)
+    return trace
+
+
+def measure(run):
+    # Timed and memory-traced in separate passes; tracemalloc slows everything down a lot
+    started = time.perf_counter()
+    result = run()
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(args, directory):
+    stages = {}
+
+    def record(stage, elapsed, peak, items, latencies=None):
+        stages[stage] = {
+            "seconds": round(elapsed, 4),
+            "per_second": round(items / elapsed, 1) if elapsed else None,
+            "peak_mb": round(peak / 1e6, 2),
+            "p50_ms": round(percentile(latencies, 0.5) * 1000, 1) if latencies else None,
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 1) if latencies else None
+        }
+
+    server = MockSocrata(
+        args.latency,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        missing_rate=args.missing_rate,
+        retry_after=args.retry_after,
+        catalog_size=args.rows
+    )
+    with server:
+        reports = []
+        for n in range(args.reports):
+            path = os.path.join(directory, f"report_{n}.txt")
+            write_report(path, args.rows // args.reports, server.base_url, seed=n)
+            reports.append(ReportSource(os.path.basename(path), path, None))
+
+        index, elapsed, peak = measure(lambda: build_index(reports, args.workers))
+        record("parse", elapsed, peak, index.stats["lines"])
+        records = list(index.records())
+
+        # The token bucket would otherwise cap every run at the production request rate
+        socrata_client.rate_with_app_token = args.rate
+        rows = None
+        for stage, bulk in [("fetch (per ID)", False), ("fetch (bulk)", True)]:
+            if stage == "fetch (per ID)" and args.skip_per_id:
+                continue
+            latencies = []
+            fetcher = MetadataFetcher(
+                "benchmark",
+                max_concurrency=args.concurrency,
+                pool_size=args.concurrency,
+                use_bulk_lookup=bulk,
+                base_url=server.base_url,
+                trace_configs=[latency_trace(latencies)]
+            )
+            passes = []
+
+            def fetch():
+                latencies.clear()
+                rows = fetcher.run(records)
+                passes.append(list(latencies))
+                return rows
+
+            rows, elapsed, peak = measure(fetch)
+            record(stage, elapsed, peak, len(records), passes[0])  # Latencies of the untraced pass
+
+        # Full catalog sync, then the same lookups answered from the mirror alone
+        fetcher = MetadataFetcher(
+            "benchmark", max_concurrency=args.concurrency, pool_size=args.concurrency, base_url=server.base_url
+        )
+        mirror = CatalogMirror(os.path.join(directory, "catalog_mirror.sqlite"))
+        domain = cache_key(records[0][0])[0]
+        counts, elapsed, peak = measure(lambda: sync_catalog(fetcher, mirror, domain, full=True))
+        record("catalog sync", elapsed, peak, counts["assets"])
+        fetcher.mirror = mirror
+        fetcher.offline = True
+        mirrored_rows, elapsed, peak = measure(lambda: fetcher.run(records))
+        record("fetch (mirror)", elapsed, peak, len(records))
+
+        analytics, elapsed, peak = measure(lambda: ErrorAnalytics().add(rows))
+        record("analytics", elapsed, peak, len(rows))
+        summaries, elapsed, peak = measure(lambda: [analytics.summary(dimension) for dimension in dimensions])
+        record("summaries", elapsed, peak, len(analytics.cells))
+
+        df, elapsed, peak = measure(lambda: results_frame(rows))
+        record("results table", elapsed, peak, len(rows))
+
+        for name, (extension, mime, writer) in export_formats.items():
+            if args.skip_excel and name == "Excel":
+                continue
+            path = os.path.join(directory, f"export{extension}")
+            result, elapsed, peak = measure(lambda: export_to_path(df, path, name))
+            record(f"export {name}", elapsed, peak, len(df))
+    return stages, server.stats
+
+
+def print_stages(stages, baseline=None):
+    print(f"{'stage':<18}{'seconds':>10}{'per s':>12}{'p50 ms':>9}{'p99 ms':>9}{'peak MB':>9}", end="")
+    print(f"{'vs base':>10}" if baseline else "")
+    for stage, numbers in stages.items():
+        cells = [
+            f"{numbers['seconds']:>10.3f}",
+            f"{numbers['per_second'] or 0:>12.0f}",
+            f"{numbers['p50_ms'] if numbers['p50_ms'] is not None else '':>9}",
+            f"{numbers['p99_ms'] if numbers['p99_ms'] is not None else '':>9}",
+            f"{numbers['peak_mb']:>9.1f}"
+        ]
+        print(f"{stage:<18}" + "".join(cells), end="")
+        if baseline:
+            before = baseline.get(stage, {}).get("seconds")
+            change = f"{(numbers['seconds'] - before) / before:+.0%}" if before else "n/a"
+            print(f"{change:>10}")
+        else:
+            print()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the parse, fetch and export stages offline.")
+    parser.add_argument("--rows", type=int, default=5000, help="Report lines in total")
+    parser.add_argument("--reports", type=int, default=1, help="Split the lines over this many report files")
+    parser.add_argument("--workers", type=int, default=parse_workers, help="Report parse processes")
+    parser.add_argument("--concurrency", type=int, default=20, help="Metadata requests in flight")
+    parser.add_argument("--rate", type=float, default=10000.0, help="Client token-bucket rate (requests/second)")
+    parser.add_argument("--latency", type=float, default=0.02, help="Mock server seconds per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of HTTP 500 responses")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of HTTP 429 responses")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="Retry-After seconds sent with a 429")
+    parser.add_argument("--missing-rate", type=float, default=0.0, help="Share of dataset IDs that 404")
+    parser.add_argument("--skip-per-id", action="store_true", help="Only benchmark bulk lookups")
+    parser.add_argument("--skip-excel", action="store_true", help="Excel is by far the slowest format")
+    parser.add_argument("--json", help="Save the results to this file")
+    parser.add_argument("--compare", help="Results file of an earlier run to compare against")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as saved:
+            baseline = json.load(saved)
+        print(f"Comparing against {baseline.get('revision') or 'unknown revision'} ({args.compare})")
+
+    with tempfile.TemporaryDirectory() as directory:
+        stages, server_stats = run_benchmarks(args, directory)
+    print_stages(stages, baseline and baseline["stages"])
+    print("Mock server: " + ", ".join(f"{count} {name}" for name, count in server_stats.items()))
+
+    if args.json:
+        with open(args.json, "w") as out:
+            results = {"revision": git_revision(), "args": vars(args), "stages": stages, "server": server_stats}
+            json.dump(results, out, indent=2)
+        print(f"Saved results to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import argparse
+import asyncio
+import random
+import threading
+from datetime import datetime, timezone
+
+from aiohttp import web
+
+from synthetic_reports import dataset_number, synthetic_view
+
+# Local stand-in for a Socrata portal, so the fetch benchmarks run offline:
+#
+#   python benchmarks/mock_socrata.py --port 8080 --latency 0.05 --throttle-rate 0.01
+#
+# Serves GET /api/views/metadata/v1/<id> (with ETag / 304 support), PATCH of
+# the same URL, GET /api/views.json?ids=... and a Discovery API catalog of
+# catalog_size assets (GET /api/catalog/v1 with scroll_id paging) with a
+# configurable latency, share of 500s, share of 429s (with Retry-After) and
+# share of unknown IDs (404).
+
+
+class MockSocrata:
+    def __init__(
+        self,
+        latency=0.02,
+        jitter=0.5,
+        error_rate=0.0,
+        throttle_rate=0.0,
+        missing_rate=0.0,
+        retry_after=1,
+        description_size=500,
+        catalog_size=1000,
+        seed=0
+    ):
+        self.latency = latency  # Seconds per request
+        self.jitter = jitter  # Latency varies uniformly by +/- jitter * latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.missing_rate = missing_rate
+        self.retry_after = retry_after
+        self.description_size = description_size
+        self.catalog_size = catalog_size
+        self.revisions = {}  # dataset_id -> edit count; bump to make the catalog report a change
+        self.rng = random.Random(seed)
+        self.stats = {"requests": 0, "errors": 0, "throttled": 0, "missing": 0, "not_modified": 0}
+        self.loop = None
+        self.runner = None
+        self.thread = None
+        self.base_url = None
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get("/api/views/metadata/v1/{dataset_id}", self.metadata)
+        app.router.add_patch("/api/views/metadata/v1/{dataset_id}", self.update)
+        app.router.add_get("/api/views.json", self.views)
+        app.router.add_get("/api/catalog/v1", self.catalog)
+        return app
+
+    def missing(self, dataset_id):
+        # Stable per ID, so retries and the per-ID fallback agree with the batch endpoint
+        return random.Random(dataset_id).random() < self.missing_rate
+
+    def view(self, dataset_id):
+        try:
+            return synthetic_view(dataset_number(dataset_id), self.description_size)
+        except ValueError:
+            return dict(synthetic_view(0, self.description_size), id=dataset_id)
+
+    async def delay(self):
+        self.stats["requests"] += 1
+        await asyncio.sleep(max(0.0, self.latency * (1 + self.jitter * (2 * self.rng.random() - 1))))
+        roll = self.rng.random()
+        if roll < self.throttle_rate:
+            self.stats["throttled"] += 1
+            return web.Response(status=429, headers={"Retry-After": str(self.retry_after)})
+        if roll < self.throttle_rate + self.error_rate:
+            self.stats["errors"] += 1
+            return web.Response(status=500)
+        return None
+
+    async def metadata(self, request):
+        failure = await self.delay()
+        if failure is not None:
+            return failure
+        dataset_id = request.match_info["dataset_id"]
+        if self.missing(dataset_id):
+            self.stats["missing"] += 1
+            return web.json_response({"message": "not found"}, status=404)
+        etag = f'"{dataset_id}"'
+        if request.headers.get("If-None-Match") == etag:
+            self.stats["not_modified"] += 1
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.json_response(self.view(dataset_id), headers={"ETag": etag})
+
+    async def update(self, request):
+        failure = await self.delay()
+        if failure is not None:
+            return failure
+        dataset_id = request.match_info["dataset_id"]
+        if self.missing(dataset_id):
+            self.stats["missing"] += 1
+            return web.json_response({"message": "not found"}, status=404)
+        return web.json_response(dict(self.view(dataset_id), **await request.json()))
+
+    async def views(self, request):
+        failure = await self.delay()
+        if failure is not None:
+            return failure
+        dataset_ids = [dataset_id for dataset_id in request.query.get("ids", "").split(",") if dataset_id]
+        return web.json_response([self.view(dataset_id) for dataset_id in dataset_ids if not self.missing(dataset_id)])
+
+    def catalog_entry(self, n):
+        view = synthetic_view(n, 0)
+
+        def iso(seconds):
+            return datetime.fromtimestamp(seconds, timezone.utc).isoformat().replace("+00:00", "Z")
+
+        resource = {
+            "id": view["id"],
+            "name": view["name"],
+            "type": view["assetType"],
+            "createdAt": iso(view["createdAt"]),
+            "updatedAt": iso(view["indexUpdatedAt"]),
+            "metadata_updated_at": iso(view["indexUpdatedAt"] + self.revisions.get(view["id"], 0))
+        }
+        if "parentUid" in view:
+            resource["parent_fxf"] = [view["parentUid"]]
+        return {"resource": resource, "owner": {"display_name": view["owner"]["displayName"]}}
+
+    async def catalog(self, request):
+        failure = await self.delay()
+        if failure is not None:
+            return failure
+        limit = int(request.query.get("limit", 100))
+        scroll_id = request.query.get("scroll_id")
+        start = dataset_number(scroll_id) + 1 if scroll_id else 0
+        results = [self.catalog_entry(n) for n in range(start, min(start + limit, self.catalog_size))]
+        return web.json_response({"results": results, "resultSetSize": self.catalog_size})
+
+    def start(self, host="127.0.0.1", port=0):
+        # Serves from a background thread with its own event loop; returns the base URL
+        started = threading.Event()
+
+        def serve():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            self.runner = web.AppRunner(self.app(), access_log=None)
+            self.loop.run_until_complete(self.runner.setup())
+            site = web.TCPSite(self.runner, host, port)
+            self.loop.run_until_complete(site.start())
+            bound_port = self.runner.addresses[0][1]
+            self.base_url = f"http://{host}:{bound_port}"
+            started.set()
+            self.loop.run_forever()
+            self.loop.run_until_complete(self.runner.cleanup())
+            self.loop.close()
+
+        self.thread = threading.Thread(target=serve, name="mock-socrata", daemon=True)
+        self.thread.start()
+        started.wait()
+        return self.base_url
+
+    def stop(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a mock Socrata metadata server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of HTTP 500 responses")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of HTTP 429 responses")
+    parser.add_argument("--missing-rate", type=float, default=0.0, help="Share of dataset IDs that 404")
+    args = parser.parse_args(argv)
+
+    server = MockSocrata(
+        args.latency, error_rate=args.error_rate, throttle_rate=args.throttle_rate, missing_rate=args.missing_rate
+    )
+    web.run_app(server.app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import argparse
+import os
+import random
+
+# Synthetic error reports and Socrata views for the benchmarks:
+#
+#   python benchmarks/synthetic_reports.py --rows 100000 --out reports/big.txt
+#
+# Report lines follow the export format the parser expects
+# ("... Identifier: <url>; Title: <title>; Found. <error>"), with a share of
+# repeated datasets and malformed lines.
+
+owners = [f"Owner {n}" for n in range(50)]
+asset_types = ["dataset", "chart", "map", "filter"]
+view_types = ["tabular", "geo", "href"]
+
+
+def dataset_id(n):
+    # Socrata-style four-by-four ID, unique per n
+    return f"{n >> 16:04x}-{n & 0xffff:04x}"
+
+
+def dataset_number(dataset_id):
+    left, right = dataset_id.split("-")
+    return (int(left, 16) << 16) | int(right, 16)
+
+
+def synthetic_view(n, description_size=500):
+    # The metadata document for dataset n; deterministic so every server
+    # and benchmark run agrees on it
+    rng = random.Random(n)
+    created = 1400000000 + rng.randrange(300000000)
+    view = {
+        "id": dataset_id(n),
+        "name": f"Dataset {n} " + "x" * rng.randrange(40),
+        "description": "d" * description_size,
+        "assetType": rng.choice(asset_types),
+        "createdAt": created,
+        "indexUpdatedAt": created + rng.randrange(10000000),
+        "owner": {"displayName": rng.choice(owners)},
+        "viewType": rng.choice(view_types)
+    }
+    if view["assetType"] in ("chart", "map", "filter"):
+        view["parentUid"] = dataset_id(rng.randrange(max(n, 1)))
+    return view
+
+
+def report_lines(rows, base_url="https://data.wa.gov", duplicate_rate=0.05, malformed_rate=0.001, seed=0):
+    rng = random.Random(seed)
+    for n in range(rows):
+        if rng.random() < malformed_rate:
+            yield f"Check failed. Identifier: {base_url}/api/views/metadata/v1/{dataset_id(n)} without a title\n"
+            continue
+        target = rng.randrange(n) if n and rng.random() < duplicate_rate else n
+        url = f"{base_url}/api/views/metadata/v1/{dataset_id(target)}"
+        yield f"Check failed. Identifier: {url}; Title: Dataset {target}; Found. Error {rng.randrange(20)}: something was found\n"
+
+
+def write_report(path, rows, base_url="https://data.wa.gov", duplicate_rate=0.05, malformed_rate=0.001, seed=0):
+    with open(path, "w", encoding="utf-8") as report:
+        report.writelines(report_lines(rows, base_url, duplicate_rate, malformed_rate, seed))
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic error report.")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--base-url", default="https://data.wa.gov", help="Portal (or mock server) in the identifiers")
+    parser.add_argument("--duplicate-rate", type=float, default=0.05)
+    parser.add_argument("--malformed-rate", type=float, default=0.001)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    write_report(args.out, args.rows, args.base_url, args.duplicate_rate, args.malformed_rate, args.seed)
+    print(f"Wrote {args.rows} lines ({os.path.getsize(args.out) / 1e6:.1f} MB) to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
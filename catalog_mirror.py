@@ -0,0 +1,274 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from catalog_bulk import fetch_views
+from fetch_pipeline import run_pipeline
+from metadata_decode import ViewMetadata, loads
+from socrata_client import SocrataClient
+
+# Local mirror of whole portal catalogs, for offline enrichment.
+# "sync" lists a domain's catalog through the Discovery API (IDs and their
+# last-change timestamps, a thousand per request), fetches the full view
+# metadata only for assets that are new or changed since the previous sync
+# through the views.json batch endpoint, and drops assets that disappeared.
+# Lookups by ID, owner, parent and name are then answered from indexed
+# SQLite tables without touching the network; MetadataFetcher consults the
+# mirror before the portal when one is given. Assets are only dropped when
+# the listing is known to be complete.
+
+default_mirror_path = "catalog_mirror.sqlite"
+catalog_page_size = 1000  # Discovery API results per request (its maximum)
+lookup_chunk_size = 500  # IDs per SQLite IN (...) query
+
+# listed: [(ViewMetadata from the listing, change marker)]; results: entries on
+# the page, with or without an ID; total: resultSetSize, if the API sent it
+CatalogPage = namedtuple("CatalogPage", ["listed", "results", "total"])
+
+
+def catalog_url(domain, base_url=None):
+    return f"{base_url or 'https://' + domain}/api/catalog/v1"
+
+
+def epoch_seconds(value):
+    # Discovery API timestamps are ISO 8601; view documents use epoch seconds
+    if not value:
+        return None
+    return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp())
+
+
+def decode_catalog_page(body):
+    # Discovery API body -> CatalogPage; results without an ID are left out of listed
+    page = loads(body)
+    if not isinstance(page, dict):
+        page = {}
+    results = page.get("results") or []
+    listed = []
+    for result in results:
+        resource = result.get("resource") or {}
+        if not resource.get("id"):
+            continue
+        parents = resource.get("parent_fxf") or []
+        view = ViewMetadata(
+            resource["id"],
+            resource.get("name"),
+            resource.get("type"),
+            epoch_seconds(resource.get("createdAt")),
+            epoch_seconds(resource.get("updatedAt")),
+            (result.get("owner") or {}).get("display_name"),
+            None,
+            parents[0] if isinstance(parents, list) and parents else parents or None
+        )
+        listed.append((view, resource.get("metadata_updated_at") or resource.get("updatedAt")))
+    total = page.get("resultSetSize")
+    return CatalogPage(listed, len(results), total if isinstance(total, int) else None)
+
+
+class CatalogMirror:
+    def __init__(self, path=default_mirror_path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS assets (
+                domain TEXT NOT NULL,
+                dataset_id TEXT NOT NULL,
+                name TEXT,
+                asset_type TEXT,
+                created_at INTEGER,
+                updated_at INTEGER,
+                owner TEXT,
+                view_type TEXT,
+                parent_uid TEXT,
+                listed_change TEXT,
+                synced_at REAL NOT NULL,
+                PRIMARY KEY (domain, dataset_id)
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS assets_owner ON assets (domain, owner)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS assets_parent ON assets (domain, parent_uid)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS assets_name ON assets (domain, name COLLATE NOCASE)")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS syncs (
+                sync_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                domain TEXT NOT NULL,
+                finished_at REAL NOT NULL,
+                assets INTEGER NOT NULL,
+                fetched INTEGER NOT NULL,
+                removed INTEGER NOT NULL
+            )
+            """
+        )
+        self.conn.commit()
+        self.hits = 0
+
+    def select(self, where, params, limit=None, ordered=True):
+        # [ViewMetadata] for the rows matching where, by name unless ordered=False
+        # (sorting would let SQLite walk the name index instead of the ID lookup)
+        query = (
+            "SELECT dataset_id, name, asset_type, created_at, updated_at, owner, view_type, parent_uid"
+            f" FROM assets WHERE {where}"
+        )
+        if ordered:
+            query += " ORDER BY name COLLATE NOCASE"
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [ViewMetadata(*row) for row in rows]
+
+    def get(self, domain, dataset_id):
+        views = self.select("domain = ? AND dataset_id = ?", (domain, dataset_id), ordered=False)
+        return views[0] if views else None
+
+    def get_many(self, domain, dataset_ids):
+        # {dataset_id: ViewMetadata} for the IDs the mirror has
+        dataset_ids = list(dataset_ids)
+        found = {}
+        for start in range(0, len(dataset_ids), lookup_chunk_size):
+            chunk = dataset_ids[start:start + lookup_chunk_size]
+            placeholders = ", ".join("?" for dataset_id in chunk)
+            for view in self.select(f"domain = ? AND dataset_id IN ({placeholders})", [domain, *chunk], ordered=False):
+                found[view.id] = view
+        return found
+
+    def by_owner(self, domain, owner, limit=None):
+        return self.select("domain = ? AND owner = ?", (domain, owner), limit)
+
+    def children(self, domain, parent_uid, limit=None):
+        return self.select("domain = ? AND parent_uid = ?", (domain, parent_uid), limit)
+
+    def search(self, domain, text, limit=200):
+        # Case-insensitive substring match on name or owner
+        pattern = f"%{text}%"
+        return self.select("domain = ? AND (name LIKE ? OR owner LIKE ?)", (domain, pattern, pattern), limit)
+
+    def listed_changes(self, domain):
+        # {dataset_id: change marker from the last listing}
+        with self.lock:
+            return dict(self.conn.execute(
+                "SELECT dataset_id, listed_change FROM assets WHERE domain = ?", (domain,)
+            ).fetchall())
+
+    def upsert(self, domain, entries):
+        # entries: [(ViewMetadata, change marker)]
+        now = time.time()
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO assets VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(domain, *view.to_list(), change, now) for view, change in entries]
+            )
+            self.conn.commit()
+
+    def remove(self, domain, dataset_ids):
+        with self.lock:
+            self.conn.executemany(
+                "DELETE FROM assets WHERE domain = ? AND dataset_id = ?",
+                [(domain, dataset_id) for dataset_id in dataset_ids]
+            )
+            self.conn.commit()
+
+    def record_sync(self, domain, assets, fetched, removed):
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO syncs (domain, finished_at, assets, fetched, removed) VALUES (?, ?, ?, ?, ?)",
+                (domain, time.time(), assets, fetched, removed)
+            )
+            self.conn.commit()
+
+    def status(self):
+        # One dict per mirrored domain: asset count and the latest sync
+        with self.lock:
+            rows = self.conn.execute(
+                """
+                SELECT domain, COUNT(*), MAX(updated_at),
+                       (SELECT MAX(finished_at) FROM syncs WHERE syncs.domain = assets.domain)
+                FROM assets GROUP BY domain ORDER BY domain
+                """
+            ).fetchall()
+        return [
+            {"Domain": domain, "Assets": count, "Newest update": newest, "Last sync": synced}
+            for domain, count, newest, synced in rows
+        ]
+
+    def clear(self, domain=None):
+        with self.lock:
+            if domain is None:
+                self.conn.execute("DELETE FROM assets")
+            else:
+                self.conn.execute("DELETE FROM assets WHERE domain = ?", (domain,))
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+async def list_catalog(client, domain, base_url=None):
+    # Every asset of the domain as ([(ViewMetadata from the listing, change marker)], complete),
+    # paged with scroll_id (the last ID of the previous page). A page shorter than the limit
+    # ends the listing; complete is False when results without an ID were skipped, when a
+    # full page had no ID to scroll from, or when fewer assets came back than resultSetSize.
+    listed = {}
+    skipped = 0
+    total = None
+    scroll_id = None
+    while True:
+        params = {"domains": domain, "search_context": domain, "limit": catalog_page_size}
+        if scroll_id is not None:
+            params["scroll_id"] = scroll_id
+        page = (await client.get(catalog_url(domain, base_url), params=params, decode=decode_catalog_page)).data
+        listed.update((view.id, (view, change)) for view, change in page.listed)
+        skipped += page.results - len(page.listed)
+        if page.total is not None:
+            total = page.total
+        if page.results < catalog_page_size:
+            break
+        if not page.listed:
+            skipped += 1  # Cannot page on: the rest of the catalog is unknown
+            break
+        scroll_id = page.listed[-1][0].id
+    complete = not skipped and (total is None or len(listed) >= total)
+    return list(listed.values()), complete
+
+
+async def sync_domain(fetcher, mirror, domain, full=False):
+    # Brings the mirror of one domain up to date; returns the sync counts.
+    # Only assets whose listing changed (or every asset with full=True) are fetched,
+    # and nothing is removed unless the whole catalog was listed.
+    async with fetcher.open_session() as session:
+        client = SocrataClient(session, fetcher.app_token)
+        listed, complete = await list_catalog(client, domain, fetcher.base_url)
+        known = mirror.listed_changes(domain)
+        changed = [(view, change) for view, change in listed if full or known.get(view.id) != change]
+        removed = set(known) - {view.id for view, change in listed} if complete else set()
+
+        async def fetch_chunk(chunk):
+            # Full view metadata where views.json has it. Otherwise the listing's
+            # fields are kept without a change marker, so the next sync tries again.
+            views = await fetch_views(client, domain, [view.id for view, change in chunk], fetcher.base_url)
+            mirror.upsert(domain, [
+                (views[view.id], change) if view.id in views else (view, None) for view, change in chunk
+            ])
+            return []
+
+        await run_pipeline(changed, fetch_chunk, workers=fetcher.max_concurrency, chunk_size=fetcher.bulk_chunk_size)
+    mirror.remove(domain, removed)
+    counts = {"assets": len(listed), "fetched": len(changed), "removed": len(removed)}
+    mirror.record_sync(domain, **counts)
+    counts["complete"] = complete
+    return counts
+
+
+def sync_catalog(fetcher, mirror, domain, full=False):
+    # Synchronous entry point for the apps and the CLI
+    if fetcher.telemetry is None:
+        return asyncio.run(sync_domain(fetcher, mirror, domain, full))
+    with fetcher.telemetry.span("stage: catalog sync"):
+        return asyncio.run(sync_domain(fetcher, mirror, domain, full))
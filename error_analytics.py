@@ -0,0 +1,177 @@
+import re
+import time
+from functools import lru_cache
+
+from metadata_pipeline import to_epoch_seconds
+from report_index import error_separator
+
+# Pre-aggregated error analytics for large reports.
+# Every "error" string is split into its distinct errors and each is reduced
+# to a normalized error class (IDs, URLs, dates, quoted values and numbers
+# replaced by placeholders), so "Column 'x' of abcd-1234 is empty" and
+# "Column 'y' of efgh-5678 is empty" count as one problem. Rows are filed
+# into cells keyed by (error class, owner, asset type, update age) as they
+# are added; each cell keeps the positions of its rows. Summaries, filtered
+# or not, are sums over the cells, which stay few however many rows there
+# are, and a drill-down collects only the rows of the matching cells.
+
+dimensions = ["Error Class", "Dataset Owner", "Type", "Update Age"]
+no_value = "(none)"
+
+# Age of the last update, relative to when the analytics were built
+age_buckets = [
+    ("Under 30 days", 30),
+    ("30-180 days", 180),
+    ("180 days-1 year", 365),
+    ("1-2 years", 730),
+    ("Over 2 years", None)
+]
+unknown_age = "Unknown"
+age_order = [label for label, days in age_buckets] + [unknown_age]
+
+# Most specific first: a URL contains IDs and numbers of its own
+class_patterns = [
+    (re.compile(r"\b\w+://\S+"), "<url>"),
+    (re.compile(r"\b\d{4}-\d{2}-\d{2}(?:[T ][\d:.]+Z?)?"), "<date>"),
+    (re.compile(r"\b(?=[a-z0-9-]{0,8}\d)[a-z0-9]{4}-[a-z0-9]{4}\b"), "<id>"),  # With a digit, unlike "read-only"
+    (re.compile(r"\"[^\"]*\"|'[^']*'"), "<value>"),
+    (re.compile(r"\d+(?:[.,]\d+)*"), "<n>"),
+    (re.compile(r"\s+"), " ")
+]
+
+
+@lru_cache(maxsize=65536)
+def error_class(error):
+    # One distinct error -> its normalized class; report errors repeat, so this is memoized
+    for pattern, placeholder in class_patterns:
+        error = pattern.sub(placeholder, error)
+    return error.strip(" .;:") or no_value
+
+
+def error_classes(error):
+    # A row's merged "error" column -> its distinct error classes
+    if not error:
+        return [no_value]
+    return list(dict.fromkeys(error_class(part) for part in error.split(error_separator)))
+
+
+def update_age(updated_at, now):
+    # Epoch seconds or an ISO 8601 date, as in the results table -> age bucket label
+    updated_at = to_epoch_seconds(updated_at)
+    if updated_at is None:
+        return unknown_age
+    days = (now - updated_at) / 86400
+    for label, max_days in age_buckets:
+        if max_days is None or days < max_days:
+            return label
+    return unknown_age
+
+
+class ErrorAnalytics:
+    def __init__(self, now=None):
+        self.now = now if now is not None else time.time()
+        self.rows = []
+        # (error class, owner, type, age) -> [row positions, report lines]; a row is in one cell per class
+        self.cells = {}
+        # (owner, type, age) -> [row positions, report lines]; every row exactly once
+        self.dataset_cells = {}
+        self.summaries = {}  # (dimension, filters) -> summary rows, until the next add()
+
+    def add(self, rows):
+        # Files more rows into the cells; can be called once per fetched batch
+        for row in rows:
+            if row is None:
+                continue
+            position = len(self.rows)
+            self.rows.append(row)
+            age = update_age(row.get("Last Update"), self.now)
+            if age == unknown_age:
+                age = update_age(row.get("Initial Upload Date"), self.now)
+            key = (row.get("Dataset Owner") or no_value, row.get("Type") or no_value, age)
+            lines = row.get("Error Count") or 1
+            for cell in [self.dataset_cells.setdefault(key, [[], 0])] + [
+                self.cells.setdefault((error, *key), [[], 0]) for error in error_classes(row.get("error"))
+            ]:
+                cell[0].append(position)
+                cell[1] += lines
+        self.summaries.clear()
+        return self
+
+    def matching_cells(self, filters=None, by_class=False):
+        # (key, [positions, lines]) of the cells matching filters: {dimension: {values}}.
+        # A dimension that is missing or empty matches everything. Unless the error
+        # class is needed, the per-dataset cells are used, so no row is seen twice.
+        filters = {dimension: set(values) for dimension, values in (filters or {}).items() if values}
+        if by_class or "Error Class" in filters:
+            cells, names = self.cells, dimensions
+        else:
+            cells, names = self.dataset_cells, dimensions[1:]
+        wanted = [(names.index(dimension), values) for dimension, values in filters.items()]
+        for key, cell in cells.items():
+            if all(key[axis] in values for axis, values in wanted):
+                yield dict(zip(names, key)), cell
+
+    def values(self, dimension):
+        # Every value of a dimension, for filter widgets
+        axis = dimensions.index(dimension)
+        values = {key[axis] for key in self.cells}
+        if dimension == "Update Age":
+            return [label for label in age_order if label in values]
+        return sorted(values, key=str.lower)
+
+    def summary(self, dimension, filters=None):
+        # Datasets and report lines per value of one dimension, largest first.
+        # A dataset with errors of several classes counts once in each class.
+        key = (dimension, frozenset((name, frozenset(values)) for name, values in (filters or {}).items() if values))
+        if key in self.summaries:
+            return self.summaries[key]
+        groups = {}
+        if dimension != "Error Class" and (filters or {}).get("Error Class"):
+            # A dataset may sit in several of the chosen classes: count it once per group
+            for cell_key, (positions, lines) in self.matching_cells(filters):
+                groups.setdefault(cell_key[dimension], set()).update(positions)
+            groups = {
+                value: (len(positions), sum(self.rows[position].get("Error Count") or 1 for position in positions))
+                for value, positions in groups.items()
+            }
+        else:
+            for cell_key, (positions, lines) in self.matching_cells(filters, by_class=dimension == "Error Class"):
+                datasets, total = groups.get(cell_key[dimension], (0, 0))
+                groups[cell_key[dimension]] = (datasets + len(positions), total + lines)
+        summary = [
+            {dimension: value, "Datasets": datasets, "Error lines": lines}
+            for value, (datasets, lines) in groups.items()
+        ]
+        if dimension == "Update Age":
+            summary.sort(key=lambda group: age_order.index(group[dimension]))
+        else:
+            summary.sort(key=lambda group: (-group["Datasets"], str(group[dimension])))
+        self.summaries[key] = summary
+        return summary
+
+    def positions(self, filters=None):
+        # Positions of the matching rows, in report order
+        positions = set()
+        for cell_key, (cell_positions, lines) in self.matching_cells(filters):
+            positions.update(cell_positions)
+        return sorted(positions)
+
+    def count(self, filters=None):
+        # Distinct datasets matching the filters
+        if not (filters or {}).get("Error Class"):
+            return sum(len(positions) for cell_key, (positions, lines) in self.matching_cells(filters))
+        return len(self.positions(filters))
+
+    def table(self):
+        # Every cell as a row: the compact form of the whole report, for export
+        return [
+            dict(zip(dimensions, key), **{"Datasets": len(positions), "Error lines": lines})
+            for key, (positions, lines) in sorted(self.cells.items(), key=lambda item: -len(item[1][0]))
+        ]
+
+    def drill_down(self, filters=None, limit=None):
+        # The matching rows, in report order; only these are turned into a table
+        positions = self.positions(filters)
+        if limit is not None:
+            positions = positions[:limit]
+        return [self.rows[position] for position in positions]
@@ -0,0 +1,322 @@
+import argparse
+import glob
+import os
+import sys
+
+import pandas as pd
+
+import metadata_pipeline
+from catalog_mirror import CatalogMirror, default_mirror_path, sync_catalog
+from exporters import export_to_path
+from lineage import describe_rollup, resolve_lineage
+from metadata_cache import MetadataCache, default_cache_path
+from metadata_pipeline import MetadataFetcher, build_dataset_info, domain_for, process_reports, results_frame
+from report_index import ReportSource, parallel_min_bytes, parse_workers
+from run_history import RunHistory, default_history_path
+from socrata_client import FetchError
+from telemetry import Telemetry, profiled
+from update_jobs import JobQueue, Worker, default_jobs_path, idle_exit
+
+# Headless entry point for the Error Pull pipeline, e.g. from cron:
+#
+#   python error_pull_cli.py run report.txt --domain wa --out results.parquet
+#   python error_pull_cli.py run reports/ 'archive/*.txt' --domain wa --out results.csv
+#   python error_pull_cli.py worker   # Runs queued description update jobs
+#   python error_pull_cli.py sync --domain wa   # Mirrors the catalog for --mirror runs
+#
+# Uses the same parse/fetch/export code as the Streamlit apps.
+
+
+def report_paths(patterns):
+    # Files, directories (every *.txt inside) and glob patterns, in order, without repeats
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths.extend(sorted(glob.glob(os.path.join(pattern, "*.txt"))))
+        elif glob.has_magic(pattern):
+            paths.extend(sorted(glob.glob(pattern, recursive=True)))
+        else:
+            paths.append(pattern)
+    return list(dict.fromkeys(paths))
+
+
+def run_reports(args, telemetry):
+    default_domain = domain_for(args.domain) if args.domain else None
+    paths = report_paths(args.reports)
+    if not paths:
+        print("No reports matched", file=sys.stderr)
+        return 1
+
+    sources = [ReportSource(os.path.basename(path), path, default_domain) for path in paths]
+    cache = None if args.no_cache else MetadataCache(args.cache)
+    fetcher = MetadataFetcher(
+        app_token=args.app_token,
+        cache=cache,
+        pool_size=args.concurrency,
+        max_concurrency=args.concurrency,
+        use_bulk_lookup=not args.no_bulk,
+        telemetry=telemetry
+    )
+    mirror = CatalogMirror(args.mirror or default_mirror_path) if args.mirror or args.offline else None
+    source = "offline" if args.offline else "mirror" if mirror is not None else "portal"
+
+    def report_progress(rows, done, parsed, parsing_done):
+        if not args.quiet:
+            print(f"\rFetched {done} of {parsed} datasets", end="", file=sys.stderr, flush=True)
+
+    # Reports stream into the fetch and repeated datasets are merged, so each is fetched once.
+    # With the run history, only new and changed datasets are fetched; a full refresh
+    # fetches everything and revalidates cached metadata.
+    report_run = process_reports(
+        fetcher,
+        sources,
+        None if args.no_history else RunHistory(args.history),
+        args.full_refresh,
+        source,
+        mirror,
+        report_progress,
+        workers=args.workers,
+        analytics=bool(args.analytics)
+    )
+    results = report_run.rows
+    parse_stats = report_run.parse_stats
+    delta = report_run.delta
+    with telemetry.span("stage: results table"):
+        df = results_frame(results)
+    if not args.quiet:
+        print(file=sys.stderr)
+
+    if parse_stats["malformed"]:
+        print(f"{len(parse_stats['malformed'])} malformed line(s) in the report(s)", file=sys.stderr)
+    if parse_stats["duplicates"]:
+        print(f"{parse_stats['duplicates']} repeated dataset line(s) merged", file=sys.stderr)
+    if "Fetch error" in df:
+        print(f"Metadata lookup failed for {df['Fetch error'].notna().sum()} dataset(s)", file=sys.stderr)
+    if delta is not None:
+        print(
+            "Since the last run: {new} new, {changed} changed, {unchanged} unchanged, "
+            "{resolved} resolved; fetched {fetched}".format(**delta.counts),
+            file=sys.stderr
+        )
+    if cache is not None:
+        print(
+            f"Cache: {cache.hits} hits, {cache.revalidated} revalidated, {cache.misses} misses",
+            file=sys.stderr
+        )
+    if fetcher.mirror is not None:
+        print(f"Catalog mirror: {fetcher.mirror.hits} hits", file=sys.stderr)
+
+    with telemetry.span("stage: export"):
+        export_to_path(df, args.out)
+    print(f"Wrote {len(df)} rows to {args.out}", file=sys.stderr)
+    if delta is not None and args.resolved_out:
+        export_to_path(results_frame(delta.resolved), args.resolved_out)
+        print(f"Wrote {len(delta.resolved)} resolved rows to {args.resolved_out}", file=sys.stderr)
+    if args.analytics:
+        # Datasets per error class, owner, asset type and update age
+        analytics = report_run.analytics
+        for group in analytics.summary("Error Class")[:5]:
+            print(f"{group['Datasets']} dataset(s): {group['Error Class']}", file=sys.stderr)
+        export_to_path(pd.DataFrame(analytics.table()), args.analytics)
+        print(f"Wrote {len(analytics.cells)} analytics rows to {args.analytics}", file=sys.stderr)
+    if args.lineage:
+        # Erroring derived views grouped by root dataset, largest group first
+        rollup = resolve_lineage(fetcher, results).rollup(results)
+        for group in rollup[:5]:
+            print(describe_rollup(group), file=sys.stderr)
+        export_to_path(pd.DataFrame(rollup), args.lineage)
+        print(f"Wrote {len(rollup)} lineage roll-up rows to {args.lineage}", file=sys.stderr)
+    return 0
+
+
+def run(args):
+    telemetry = Telemetry()
+    with profiled(args.profile) as profile:
+        status = run_reports(args, telemetry)
+    if profile["report"]:
+        if args.profile_out:
+            with open(args.profile_out, "w") as out:
+                out.write(profile["report"])
+        else:
+            print(profile["report"], file=sys.stderr)
+    if args.telemetry:
+        telemetry.write(args.telemetry)
+        print(f"Wrote run telemetry to {args.telemetry}", file=sys.stderr)
+    return status
+
+
+def trend(args):
+    # Prints the per-run summaries kept in the run history
+    runs = pd.DataFrame(RunHistory(args.history).trend(args.runs))
+    if runs.empty:
+        print("No runs recorded yet", file=sys.stderr)
+        return 0
+    runs["Run"] = pd.to_datetime(runs["Run"], unit="s").dt.strftime("%Y-%m-%d %H:%M")
+    print(runs.to_string(index=False))
+    return 0
+
+
+def sync(args):
+    # Mirrors each domain's catalog; only assets changed since the last sync are fetched
+    mirror = CatalogMirror(args.mirror)
+    fetcher = MetadataFetcher(
+        app_token=args.app_token, pool_size=args.concurrency, max_concurrency=args.concurrency
+    )
+    failed = False
+    for domain in args.domain:
+        try:
+            counts = sync_catalog(fetcher, mirror, domain_for(domain), full=args.full)
+        except FetchError as e:
+            print(f"{domain_for(domain)}: the catalog could not be synced: {e}", file=sys.stderr)
+            failed = True
+            continue
+        print(
+            f"{domain_for(domain)}: {counts['assets']} assets, {counts['fetched']} fetched, "
+            f"{counts['removed']} removed" + ("" if counts["complete"] else " (listing incomplete, nothing removed)"),
+            file=sys.stderr
+        )
+    return 1 if failed else 0
+
+
+def catalog(args):
+    # Offline lookups in the catalog mirror
+    mirror = CatalogMirror(args.mirror)
+    domain = domain_for(args.domain)
+    if args.owner:
+        views = mirror.by_owner(domain, args.owner)
+    elif args.parent:
+        views = mirror.children(domain, args.parent)
+    elif args.search:
+        views = mirror.search(domain, args.search, limit=None)
+    else:
+        status = pd.DataFrame(mirror.status())
+        if status.empty:
+            print("No catalogs mirrored yet", file=sys.stderr)
+            return 0
+        for column in ["Newest update", "Last sync"]:
+            status[column] = pd.to_datetime(status[column], unit="s").dt.strftime("%Y-%m-%d %H:%M")
+        print(status.to_string(index=False))
+        return 0
+    df = results_frame([build_dataset_info(view, None, domain) for view in views])
+    if args.out:
+        export_to_path(df, args.out)
+        print(f"Wrote {len(df)} rows to {args.out}", file=sys.stderr)
+    else:
+        print(df.to_string(index=False))
+    return 0
+
+
+def worker(args):
+    # Runs queued update jobs; credentials come from the environment so they never touch the job file
+    email = os.environ.get("SOCRATA_EMAIL")
+    password = os.environ.get("SOCRATA_PASSWORD")
+    if not email or not password:
+        print("Set SOCRATA_EMAIL and SOCRATA_PASSWORD to run update jobs", file=sys.stderr)
+        return 1
+    queue = JobQueue(args.jobs)
+    Worker(queue, email, password, args.app_token).run(idle_exit=args.idle_exit or None)
+    return 0
+
+
+def jobs(args):
+    # Lists recent update jobs, or cancels / retries one
+    queue = JobQueue(args.jobs)
+    if args.cancel is not None:
+        queue.cancel(args.cancel)
+        print(f"Cancelled job {args.cancel}", file=sys.stderr)
+    if args.retry is not None:
+        print(f"Requeued {queue.retry_failed(args.retry)} failed dataset(s) of job {args.retry}", file=sys.stderr)
+    recent = pd.DataFrame(queue.recent(args.runs))
+    if recent.empty:
+        print("No update jobs queued yet", file=sys.stderr)
+        return 0
+    for column in ["Created", "Finished"]:
+        recent[column] = pd.to_datetime(recent[column], unit="s").dt.strftime("%Y-%m-%d %H:%M")
+    print(recent.to_string(index=False))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="error-pull", description="Pull Socrata metadata for error reports.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subcommands.add_parser("run", help="Parse error reports, fetch metadata and export the results")
+    run_parser.add_argument("reports", nargs="+", help="Error-report TXT files, directories or glob patterns")
+    run_parser.add_argument("--domain", help="State abbreviation (wa) or portal domain for bare dataset IDs")
+    run_parser.add_argument("--out", required=True, help="Output file: .parquet, .csv, .jsonl or .xlsx")
+    run_parser.add_argument("--app-token", default=os.environ.get("SOCRATA_APP_TOKEN"), help="Defaults to $SOCRATA_APP_TOKEN")
+    run_parser.add_argument(
+        "--workers", type=int, default=parse_workers,
+        help=f"Processes used to parse reports once several add up to {parallel_min_bytes // 2 ** 20} MB or more; "
+             "the first report streams into the fetch meanwhile"
+    )
+    run_parser.add_argument("--concurrency", type=int, default=metadata_pipeline.max_concurrency)
+    run_parser.add_argument("--cache", default=default_cache_path, help="Metadata cache file")
+    run_parser.add_argument("--no-cache", action="store_true", help="Always fetch from the portal")
+    run_parser.add_argument("--no-bulk", action="store_true", help="One metadata request per dataset")
+    run_parser.add_argument("--mirror", help="Catalog mirror file to look datasets up in before the portal")
+    run_parser.add_argument(
+        "--offline", action="store_true", help="Only use the catalog mirror (default file unless --mirror is given)"
+    )
+    run_parser.add_argument("--history", default=default_history_path, help="Run history file")
+    run_parser.add_argument("--no-history", action="store_true", help="Fetch everything and do not record the run")
+    run_parser.add_argument(
+        "--full-refresh", action="store_true", help="Refetch unchanged datasets too, revalidating cached metadata"
+    )
+    run_parser.add_argument("--resolved-out", help="Also export the datasets resolved since the last run")
+    run_parser.add_argument(
+        "--analytics", help="Also export dataset counts per error class, owner, asset type and update age"
+    )
+    run_parser.add_argument("--lineage", help="Also resolve parent datasets and export the per-root roll-up")
+    run_parser.add_argument(
+        "--telemetry", help="Write stage/request timings and counters: .json, or .prom for Prometheus text"
+    )
+    run_parser.add_argument("--profile", choices=["cprofile", "pyinstrument"], help="Profile the run")
+    run_parser.add_argument("--profile-out", help="Profile report file (default: stderr)")
+    run_parser.add_argument("--quiet", action="store_true")
+    run_parser.set_defaults(func=run)
+
+    trend_parser = subcommands.add_parser("trend", help="Show error counts of previous runs")
+    trend_parser.add_argument("--history", default=default_history_path, help="Run history file")
+    trend_parser.add_argument("--runs", type=int, default=30, help="Number of most recent runs")
+    trend_parser.set_defaults(func=trend)
+
+    sync_parser = subcommands.add_parser("sync", help="Mirror portal catalogs for offline lookups")
+    sync_parser.add_argument("--domain", action="append", required=True, help="State abbreviation or portal domain")
+    sync_parser.add_argument("--mirror", default=default_mirror_path, help="Catalog mirror file")
+    sync_parser.add_argument("--full", action="store_true", help="Refetch every asset, not only changed ones")
+    sync_parser.add_argument("--app-token", default=os.environ.get("SOCRATA_APP_TOKEN"), help="Defaults to $SOCRATA_APP_TOKEN")
+    sync_parser.add_argument("--concurrency", type=int, default=metadata_pipeline.max_concurrency)
+    sync_parser.set_defaults(func=sync)
+
+    catalog_parser = subcommands.add_parser("catalog", help="Look up assets in the catalog mirror")
+    catalog_parser.add_argument("--domain", default="wa", help="State abbreviation or portal domain")
+    catalog_parser.add_argument("--mirror", default=default_mirror_path, help="Catalog mirror file")
+    lookup = catalog_parser.add_mutually_exclusive_group()
+    lookup.add_argument("--owner", help="Assets owned by this user (display name)")
+    lookup.add_argument("--parent", help="Views derived from this dataset ID")
+    lookup.add_argument("--search", help="Substring of the name or owner")
+    catalog_parser.add_argument("--out", help="Export the matches instead of printing them")
+    catalog_parser.set_defaults(func=catalog)
+
+    worker_parser = subcommands.add_parser("worker", help="Run queued description update jobs")
+    worker_parser.add_argument("--jobs", default=default_jobs_path, help="Update job file")
+    worker_parser.add_argument("--app-token", default=os.environ.get("SOCRATA_APP_TOKEN"), help="Defaults to $SOCRATA_APP_TOKEN")
+    worker_parser.add_argument(
+        "--idle-exit", type=float, default=idle_exit, help="Exit after this many idle seconds (0: keep running)"
+    )
+    worker_parser.set_defaults(func=worker)
+
+    jobs_parser = subcommands.add_parser("jobs", help="Show, cancel or retry description update jobs")
+    jobs_parser.add_argument("--jobs", default=default_jobs_path, help="Update job file")
+    jobs_parser.add_argument("--runs", type=int, default=20, help="Number of most recent jobs")
+    jobs_parser.add_argument("--cancel", type=int, metavar="JOB", help="Stop a job after its current batch")
+    jobs_parser.add_argument("--retry", type=int, metavar="JOB", help="Requeue a job's failed datasets")
+    jobs_parser.set_defaults(func=jobs)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+import json
+import os
+import tempfile
+
+import pandas as pd
+
+# Export formats for the results table.
+# Every writer streams the DataFrame to a binary file object in row chunks, so
+# no format builds a second full copy of the file in memory. Excel uses
+# openpyxl's write-only (constant memory) workbook and spills onto extra
+# sheets past Excel's row limit.
+
+chunk_rows = 10000  # Rows converted and written per step
+excel_max_rows = 1048576 - 1  # Excel's sheet limit, minus the header row
+
+
+def iter_chunks(df, size=chunk_rows):
+    for start in range(0, len(df), size):
+        yield df.iloc[start:start + size]
+
+
+def naive_utc(df):
+    # Timezone-aware datetimes as naive UTC (Excel and some readers reject tz)
+    converted = {
+        column: df[column].dt.tz_localize(None)
+        for column in df.columns
+        if isinstance(df[column].dtype, pd.DatetimeTZDtype)
+    }
+    return df.assign(**converted) if converted else df
+
+
+def write_csv(df, out):
+    for index, chunk in enumerate(iter_chunks(df)):
+        out.write(chunk.to_csv(index=False, header=index == 0).encode("utf-8"))
+    if len(df) == 0:
+        out.write(df.to_csv(index=False).encode("utf-8"))
+
+
+def write_jsonl(df, out):
+    for chunk in iter_chunks(df):
+        text = chunk.to_json(orient="records", lines=True, date_format="iso")
+        if text and not text.endswith("\n"):
+            text += "\n"  # Older pandas leave the last line unterminated
+        out.write(text.encode("utf-8"))
+
+
+def write_parquet(df, out):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(out, schema) as writer:
+        for chunk in iter_chunks(df):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+def excel_value(value):
+    if value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, float) and value != value:
+        return None
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    return value
+
+
+def write_excel(df, out, sheet_name="Datasets"):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    df = naive_utc(df)
+    header = [str(column) for column in df.columns]
+    sheet, sheet_rows, sheet_number = None, excel_max_rows, 0
+    for chunk in iter_chunks(df):
+        for row in chunk.itertuples(index=False, name=None):
+            if sheet_rows >= excel_max_rows:
+                sheet_number += 1
+                sheet = workbook.create_sheet(sheet_name if sheet_number == 1 else f"{sheet_name} {sheet_number}")
+                sheet.append(header)
+                sheet_rows = 0
+            sheet.append([excel_value(value) for value in row])
+            sheet_rows += 1
+    if sheet is None:
+        workbook.create_sheet(sheet_name).append(header)
+    workbook.save(out)
+
+
+# name: (file extension, MIME type, writer)
+export_formats = {
+    "Excel": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", write_excel),
+    "CSV": (".csv", "text/csv", write_csv),
+    "Parquet": (".parquet", "application/vnd.apache.parquet", write_parquet),
+    "JSON Lines": (".jsonl", "application/jsonl", write_jsonl)
+}
+
+
+def format_for_path(path):
+    suffix = os.path.splitext(str(path))[1].lower()
+    if suffix == ".ndjson":
+        suffix = ".jsonl"
+    for name, (extension, mime, writer) in export_formats.items():
+        if extension == suffix:
+            return name
+    raise ValueError(f"Unsupported output format: {suffix or path}")
+
+
+def export_to_path(df, path, format_name=None):
+    writer = export_formats[format_name or format_for_path(path)][2]
+    with open(path, "wb") as out:
+        writer(df, out)
+
+
+def export_to_tempfile(df, format_name):
+    # Writes the export to a temporary file on disk and returns its path;
+    # the caller removes it when done
+    extension = export_formats[format_name][0]
+    handle, path = tempfile.mkstemp(prefix="dataset_info_", suffix=extension)
+    os.close(handle)
+    export_to_path(df, path, format_name)
+    return path
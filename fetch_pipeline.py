@@ -0,0 +1,156 @@
+import asyncio
+import time
+
+# Producer/consumer pipeline for the parse -> fetch -> render stages.
+# Parsed records go onto a bounded queue, fetch workers drain it, and finished
+# rows are handed to on_batch in small batches so the UI can show them while
+# the rest of the report is still being fetched.
+
+default_queue_size = 200  # Parsed records allowed to wait for a worker
+default_batch_size = 50  # Rows per on_batch call
+default_batch_interval = 1.0  # Max seconds a finished row waits before on_batch
+
+
+async def as_async_iter(records):
+    # Lets run_pipeline take plain iterables (the parser) or async iterables (a fan-out queue)
+    if hasattr(records, "__aiter__"):
+        async for record in records:
+            yield record
+    else:
+        for record in records:
+            yield record
+
+
+async def run_pipeline(
+    records,
+    fetch_row,
+    on_batch=None,
+    workers=20,
+    queue_size=default_queue_size,
+    batch_size=default_batch_size,
+    batch_interval=default_batch_interval,
+    chunk_size=None
+):
+    # records: iterable or async iterable of argument tuples for fetch_row (consumed lazily)
+    # fetch_row: coroutine function returning one row (or None); with
+    #   chunk_size set it is called with a list of up to chunk_size records
+    #   and returns a list of rows instead
+    # on_batch(rows, done, parsed, parsing_done): called from the event loop
+    queue = asyncio.Queue(maxsize=queue_size)
+    results = []
+    pending = []
+    progress = {"parsed": 0, "done": 0, "parsing_done": False}
+    last_flush = time.monotonic()
+
+    def flush():
+        nonlocal pending, last_flush
+        batch, pending = pending, []
+        last_flush = time.monotonic()
+        if on_batch is not None:
+            on_batch(batch, progress["done"], progress["parsed"], progress["parsing_done"])
+
+    async def produce():
+        chunk = []
+        async for record in as_async_iter(records):
+            progress["parsed"] += 1
+            if chunk_size is None:
+                await queue.put(record)
+                continue
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                await queue.put(chunk)
+                chunk = []
+        if chunk:
+            await queue.put(chunk)
+        progress["parsing_done"] = True
+        for _ in range(workers):
+            await queue.put(None)
+
+    async def consume():
+        while True:
+            record = await queue.get()
+            if record is None:
+                return
+            if chunk_size is None:
+                rows = [await fetch_row(*record)]
+                progress["done"] += 1
+            else:
+                rows = await fetch_row(record)
+                progress["done"] += len(record)
+            for row in rows:
+                if row is not None:
+                    results.append(row)
+                    pending.append(row)
+            if len(pending) >= batch_size or time.monotonic() - last_flush >= batch_interval:
+                flush()
+
+    tasks = [asyncio.ensure_future(produce())] + [asyncio.ensure_future(consume()) for _ in range(workers)]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # After a failure (e.g. on_batch raising), stop the stages still waiting on the queue
+        await cancel(tasks)
+    flush()
+    return results
+
+
+async def cancel(tasks):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def run_fan_out(records, key, run_group, queue_size=default_queue_size):
+    # Routes records, as they are parsed, to one pipeline per key (e.g. one per
+    # domain) so every group runs concurrently with its own pool and limits.
+    # run_group(key, async_records) is started the first time a key is seen.
+    # Returns {key: run_group result}. If a group fails, the others are
+    # cancelled and its exception is raised.
+    queues = {}
+    tasks = {}
+
+    async def drain(group_queue):
+        while True:
+            record = await group_queue.get()
+            if record is None:
+                return
+            yield record
+
+    def check_groups():
+        # Raises the exception of a group that failed; nothing reads its queue any more
+        for task in tasks.values():
+            if task.done() and (task.cancelled() or task.exception() is not None):
+                task.result()
+
+    async def put(group, record):
+        # Waits for room on the group's queue, unless a group fails meanwhile
+        group_queue = queues[group]
+        check_groups()
+        if not group_queue.full():
+            group_queue.put_nowait(record)
+            return
+        putter = asyncio.ensure_future(group_queue.put(record))
+        try:
+            while not putter.done():
+                running = [task for task in tasks.values() if not task.done()]
+                await asyncio.wait([putter, *running], return_when=asyncio.FIRST_COMPLETED)
+                check_groups()
+        finally:
+            putter.cancel()
+
+    try:
+        for count, record in enumerate(records, start=1):
+            group = key(record)
+            if group not in queues:
+                queues[group] = asyncio.Queue(maxsize=queue_size)
+                tasks[group] = asyncio.create_task(run_group(group, drain(queues[group])))
+            await put(group, record)
+            if count % queue_size == 0:
+                await asyncio.sleep(0)  # Let the group pipelines start while we keep parsing
+        for group in queues:
+            await put(group, None)
+        results = await asyncio.gather(*tasks.values())
+    except BaseException:
+        await cancel(tasks.values())
+        raise
+    return dict(zip(tasks, results))
@@ -0,0 +1,156 @@
+import asyncio
+
+from fetch_pipeline import run_pipeline
+from metadata_pipeline import metadata_url
+from socrata_client import SocrataClient
+
+# Parent/derived-view lineage for the datasets in a report.
+# Every fetched row is a node keyed by (domain, dataset ID) with an edge to
+# its "Parent UID". Parents that are not in the graph yet are fetched one
+# level at a time, all of a level's unique parents together, so a shared
+# ancestor is fetched once however many views point at it and the work grows
+# with the number of unique nodes rather than rows times chain length. Roots
+# are then resolved with a memo and erroring views are rolled up per root.
+
+max_depth = 50  # Parent levels followed before a chain is cut off (guards against cycles)
+
+
+def parent_uid(row):
+    # "Parent UID" is an ID, or a list of IDs from parent_fxf
+    parent = row.get("Parent UID")
+    if isinstance(parent, (list, tuple)):
+        parent = parent[0] if parent else None
+    return parent or None
+
+
+class LineageGraph:
+    def __init__(self):
+        self.nodes = {}  # (domain, dataset_id) -> row
+        self.roots = {}  # (domain, dataset_id) -> (root key, depth), filled by root()
+
+    def add(self, rows, attempted=()):
+        # attempted: keys that were asked for; any the fetch did not return
+        # are stored as unresolved so they are not asked for again
+        for row in rows:
+            if row is not None and row.get("Unique ID"):
+                self.nodes[(row["Domain"], row["Unique ID"])] = row
+        for key in attempted:
+            self.nodes.setdefault(key, {"Unique ID": key[1], "Domain": key[0], "Fetch error": "not returned"})
+
+    def missing_parents(self):
+        # Unique parent keys not fetched yet; parents live on the same portal as the view
+        missing = set()
+        for (domain, dataset_id), row in self.nodes.items():
+            parent = parent_uid(row)
+            if parent is not None and (domain, parent) not in self.nodes:
+                missing.add((domain, parent))
+        return missing
+
+    def root(self, key):
+        # (root key, depth) for a node, memoized along the whole chain
+        chain = []
+        seen = set()
+        while key not in self.roots:
+            row = self.nodes.get(key)
+            parent = parent_uid(row) if row is not None else None
+            if parent is None or key in seen or len(chain) >= max_depth:
+                self.roots[key] = (key, 0)
+                break
+            seen.add(key)
+            chain.append(key)
+            key = (key[0], parent)
+        root, depth = self.roots[key]
+        for step, node in enumerate(reversed(chain), start=1):
+            self.roots[node] = (root, depth + step)
+        return self.roots[chain[0]] if chain else self.roots[key]
+
+    def view_lineage(self, rows):
+        # One row per report row: its root and how many parent links away it is
+        lineage = []
+        for row in rows:
+            key = (row["Domain"], row["Unique ID"])
+            (root_domain, root_id), depth = self.root(key)
+            root_row = self.nodes.get((root_domain, root_id), {})
+            lineage.append({
+                "Unique ID": row["Unique ID"],
+                "Dataset Name": row.get("Dataset Name"),
+                "Domain": row["Domain"],
+                "Parent UID": parent_uid(row),
+                "Root UID": root_id,
+                "Root Name": root_row.get("Dataset Name"),
+                "Lineage Depth": depth,
+                "error": row.get("error")
+            })
+        return lineage
+
+    def rollup(self, rows):
+        # Erroring derived views grouped by their root dataset, largest group first
+        groups = {}
+        reported = {(row["Domain"], row["Unique ID"]) for row in rows}
+        for view in self.view_lineage(rows):
+            if view["Lineage Depth"] == 0:
+                continue
+            groups.setdefault((view["Domain"], view["Root UID"]), []).append(view)
+        summary = []
+        for (domain, root_id), views in groups.items():
+            root_row = self.nodes.get((domain, root_id), {})
+            summary.append({
+                "Root UID": root_id,
+                "Root Name": root_row.get("Dataset Name"),
+                "Domain": domain,
+                "Erroring views": len(views),
+                "Root in report": (domain, root_id) in reported,
+                "Root lookup failed": "Fetch error" in root_row,
+                "Max depth": max(view["Lineage Depth"] for view in views),
+                "View UIDs": ", ".join(view["Unique ID"] for view in views),
+                "Root link": metadata_url(domain, root_id)
+            })
+        summary.sort(key=lambda group: (-group["Erroring views"], group["Root UID"]))
+        return summary
+
+
+def describe_rollup(group):
+    # "12 erroring views share root dataset abcd-1234 (Parcels)"
+    name = f" ({group['Root Name']})" if group["Root Name"] else ""
+    views = "view shares" if group["Erroring views"] == 1 else "views share"
+    return f"{group['Erroring views']} erroring {views} root dataset {group['Root UID']}{name}"
+
+
+async def fetch_lineage(fetcher, graph, rows):
+    # Adds rows to the graph, then fetches missing parents level by level
+    # through the fetcher's cache, bulk lookups and rate limits
+    graph.add(rows)
+    async with fetcher.open_session() as session:
+        client = SocrataClient(session, fetcher.app_token)
+
+        async def fetch_row(url, error):
+            return await fetcher.fetch_dataset_info(client, url, error)
+
+        async def fetch_rows(records):
+            return await fetcher.fetch_dataset_infos_bulk(client, records)
+
+        for level in range(max_depth):
+            missing = graph.missing_parents()
+            if not missing:
+                break
+            records = [(metadata_url(domain, dataset_id), None) for domain, dataset_id in sorted(missing)]
+            if fetcher.use_bulk_lookup:
+                fetched = await run_pipeline(
+                    records, fetch_rows, workers=fetcher.max_concurrency, chunk_size=fetcher.bulk_chunk_size
+                )
+            else:
+                fetched = await run_pipeline(records, fetch_row, workers=fetcher.max_concurrency)
+            graph.add(fetched, attempted=missing)
+            if fetcher.telemetry is not None:
+                fetcher.telemetry.count("lineage_nodes_fetched", len(missing))
+    return graph
+
+
+def resolve_lineage(fetcher, rows, graph=None):
+    # Synchronous entry point: returns the LineageGraph for the report rows
+    rows = [row for row in rows if row is not None]
+    graph = graph if graph is not None else LineageGraph()
+    if fetcher.telemetry is None:
+        return asyncio.run(fetch_lineage(fetcher, graph, rows))
+    with fetcher.telemetry.span("stage: lineage"):
+        return asyncio.run(fetch_lineage(fetcher, graph, rows))
@@ -0,0 +1,151 @@
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse
+
+from metadata_decode import ViewMetadata, decode_view, dumps, loads
+
+# Local SQLite cache for /api/views/metadata/v1/<id> responses, stored as
+# their ViewMetadata projection.
+# Entries are keyed by domain + dataset ID, expire after a TTL, are revalidated
+# with ETag / If-Modified-Since once stale and are evicted least-recently-used
+# once the cache grows past max_entries.
+
+default_cache_path = "metadata_cache.sqlite"
+default_ttl = 24 * 60 * 60  # Seconds before an entry must be revalidated
+default_max_entries = 50000
+
+
+def cache_key(url):
+    # "https://data.wa.gov/api/views/metadata/v1/abcd-1234" -> ("data.wa.gov", "abcd-1234")
+    parsed = urlparse(url)
+    return parsed.netloc.lower(), parsed.path.rstrip("/").rsplit("/", 1)[-1]
+
+
+class MetadataCache:
+    def __init__(self, path=default_cache_path, ttl=default_ttl, max_entries=default_max_entries):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS metadata (
+                domain TEXT NOT NULL,
+                dataset_id TEXT NOT NULL,
+                body TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (domain, dataset_id)
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS metadata_accessed ON metadata (accessed_at)")
+        self.conn.commit()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+
+    def get(self, domain, dataset_id):
+        # Returns the cached entry (fresh or stale) or None
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT body, etag, last_modified, fetched_at FROM metadata WHERE domain = ? AND dataset_id = ?",
+                (domain, dataset_id)
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute(
+                "UPDATE metadata SET accessed_at = ? WHERE domain = ? AND dataset_id = ?",
+                (time.time(), domain, dataset_id)
+            )
+            self.conn.commit()
+        body, etag, last_modified, fetched_at = row
+        return {
+            "data": ViewMetadata.from_stored(loads(body)),
+            "etag": etag,
+            "last_modified": last_modified,
+            "fresh": time.time() - fetched_at < self.ttl
+        }
+
+    def put(self, domain, dataset_id, data, etag=None, last_modified=None):
+        # data is a ViewMetadata
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (domain, dataset_id, dumps(data.to_list()), etag, last_modified, now, now)
+            )
+            self._evict()
+            self.conn.commit()
+
+    def touch(self, domain, dataset_id):
+        # Called after a 304 Not Modified: the cached body is good for another TTL
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "UPDATE metadata SET fetched_at = ?, accessed_at = ? WHERE domain = ? AND dataset_id = ?",
+                (now, now, domain, dataset_id)
+            )
+            self.conn.commit()
+
+    def _evict(self):
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM metadata").fetchone()
+        if count > self.max_entries:
+            self.conn.execute(
+                """
+                DELETE FROM metadata WHERE rowid IN (
+                    SELECT rowid FROM metadata ORDER BY accessed_at LIMIT ?
+                )
+                """,
+                (count - self.max_entries,)
+            )
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM metadata")
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+async def fetch_with_cache(client, url, cache, revalidate=False):
+    # client is a socrata_client.SocrataClient; FetchError propagates to the caller.
+    # revalidate=True treats a fresh entry as stale, so it is checked with the server.
+    domain, dataset_id = cache_key(url)
+    entry = cache.get(domain, dataset_id)
+    if entry is not None and entry["fresh"] and not revalidate:
+        cache.hits += 1
+        return entry["data"]
+
+    # Stale or missing: ask the server, revalidating when we have validators
+    headers = {}
+    if entry is not None:
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    result = await client.get(url, headers=headers, decode=decode_view)
+    if result.status == 304 and entry is not None:
+        cache.touch(domain, dataset_id)
+        cache.revalidated += 1
+        return entry["data"]
+    cache.misses += 1
+    if result.status == 200:
+        cache.put(
+            domain,
+            dataset_id,
+            result.data,
+            etag=result.headers.get("ETag"),
+            last_modified=result.headers.get("Last-Modified")
+        )
+    return result.data
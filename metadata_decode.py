@@ -0,0 +1,115 @@
+import asyncio
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+try:
+    import orjson
+except ImportError:  # The standard library decoder works too, just slower
+    orjson = None
+
+# Lean decoding of Socrata view documents.
+# A view document carries dozens of fields (columns, grants, approvals,
+# metadata blobs...) while the results table reads eight of them. Bodies are
+# decoded with orjson when it is installed and projected straight onto a
+# slotted ViewMetadata, so the full document becomes garbage right away and
+# only the projection is kept, cached and passed around. Bodies of at least
+# offload_min_bytes (views.json batches) are decoded in a process pool: the
+# event loop keeps serving other responses and only the small projection
+# travels back.
+
+offload_min_bytes = 512 * 1024
+decode_workers = min(4, os.cpu_count() or 1)
+
+
+def loads(body):
+    return orjson.loads(body) if orjson is not None else json.loads(body)
+
+
+def dumps(value):
+    return orjson.dumps(value).decode() if orjson is not None else json.dumps(value)
+
+
+class ViewMetadata:
+    # The fields of a view document that build_dataset_info reads, and nothing else
+    __slots__ = ("id", "name", "asset_type", "created_at", "updated_at", "owner", "view_type", "parent_uid")
+
+    def __init__(
+        self,
+        id=None,
+        name=None,
+        asset_type=None,
+        created_at=None,
+        updated_at=None,
+        owner=None,
+        view_type=None,
+        parent_uid=None
+    ):
+        self.id = id
+        self.name = name
+        self.asset_type = asset_type
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.owner = owner
+        self.view_type = view_type
+        self.parent_uid = parent_uid
+
+    @classmethod
+    def from_view(cls, view):
+        # From a decoded view document
+        owner = view.get("owner")
+        return cls(
+            view.get("id"),
+            view.get("name"),
+            view.get("assetType"),
+            view.get("createdAt"),
+            view.get("indexUpdatedAt"),
+            owner.get("displayName") if isinstance(owner, dict) else None,
+            view.get("viewType"),
+            view.get("parent_fxf", view.get("parentUid"))
+        )
+
+    @classmethod
+    def from_stored(cls, value):
+        # Cache entries hold to_list() projections; older entries hold whole documents
+        return cls(*value) if isinstance(value, list) else cls.from_view(value)
+
+    def to_list(self):
+        return [getattr(self, field) for field in self.__slots__]
+
+    def __eq__(self, other):
+        return isinstance(other, ViewMetadata) and self.to_list() == other.to_list()
+
+    def __repr__(self):
+        return f"ViewMetadata({', '.join(f'{field}={getattr(self, field)!r}' for field in self.__slots__)})"
+
+
+def decode_view(body):
+    # /api/views/metadata/v1/<id> body -> ViewMetadata
+    view = loads(body)
+    if not isinstance(view, dict):
+        raise ValueError("expected a JSON object")
+    return ViewMetadata.from_view(view)
+
+
+def decode_views(body):
+    # /api/views.json body -> [ViewMetadata], skipping anything that is not a view
+    views = loads(body)
+    if not isinstance(views, list):
+        return []
+    return [ViewMetadata.from_view(view) for view in views if isinstance(view, dict) and "id" in view]
+
+
+@lru_cache(maxsize=None)
+def decode_pool():
+    # Started on the first large body and reused for the rest of the process
+    return ProcessPoolExecutor(max_workers=decode_workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+async def decode_body(body, decode=loads):
+    # decode must be a module-level function so it can be sent to the pool
+    if len(body) < offload_min_bytes:
+        return decode(body)
+    return await asyncio.get_running_loop().run_in_executor(decode_pool(), decode, body)
@@ -0,0 +1,358 @@
+import asyncio
+import contextlib
+import math
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from catalog_bulk import fetch_metadata_bulk
+from fetch_pipeline import run_fan_out, run_pipeline
+from metadata_cache import cache_key, fetch_with_cache
+from metadata_decode import ViewMetadata, decode_view
+from report_parser import iter_error_records
+from socrata_client import FetchError, SocrataClient, open_session
+
+# Parse -> fetch pipeline shared by the Streamlit apps and the CLI
+# (error_pull_cli.py). Nothing in here depends on Streamlit.
+
+# Connection pool settings for metadata requests
+pool_size = 20  # Max open connections per Socrata host
+max_concurrency = 20  # Max metadata requests in flight per host
+use_bulk_lookup = True  # Resolve IDs in batches via /api/views.json, per-ID GETs only for misses
+bulk_chunk_size = 100  # IDs per batch request
+
+# Where metadata comes from -> how the apps label it
+metadata_sources = {
+    "portal": "Portal",
+    "mirror": "Local mirror, portal for the rest",
+    "offline": "Local mirror only (offline)"
+}
+
+# One process_reports() run: result rows (history columns included when there is
+# a history), ErrorAnalytics or None, parse stats, the DeltaRun or None, and
+# (hits, revalidated, misses) of the metadata cache or None
+ReportRun = namedtuple("ReportRun", ["rows", "analytics", "parse_stats", "delta", "cache_stats"])
+
+
+def domain_for(state_or_domain):
+    # "wa" -> "data.wa.gov"; full domains pass through
+    if "." in state_or_domain:
+        return state_or_domain.lower()
+    return f"data.{state_or_domain.lower()}.gov"
+
+
+def metadata_url(domain, dataset_id):
+    return f"https://{domain}/api/views/metadata/v1/{dataset_id}"
+
+
+def record_url(identifier, default_domain=None):
+    # Report identifiers are metadata URLs; bare dataset IDs are resolved
+    # against default_domain
+    if "://" not in identifier and default_domain:
+        return metadata_url(default_domain, identifier)
+    return identifier
+
+
+def iter_report_records(stream, parse_stats, default_domain=None):
+    # Yields (metadata url, error) per dataset line
+    for record in iter_error_records(stream, parse_stats):
+        yield record_url(record.identifier, default_domain), record.error
+
+
+# Result table layout. Rows are collected with raw field values and converted
+# column by column in results_frame, instead of formatting dates per row.
+result_columns = [
+    "Unique ID", "Dataset Name", "Type", "Initial Upload Date", "Last Update", "Dataset Owner",
+    "Derived View", "Parent UID", "Dataset link", "Domain", "error"
+]
+# Added only when some row has them (merged reports, run history, failed lookups)
+optional_columns = ["Error Count", "Error Lines", "Change", "First Seen", "Runs Seen", "Fetch error"]
+date_columns = ["Initial Upload Date", "Last Update", "First Seen"]  # Epoch seconds -> UTC datetimes
+category_columns = ["Type", "Derived View", "Dataset Owner", "Domain", "Change"]
+integer_columns = ["Error Count", "Runs Seen"]
+
+
+def build_dataset_info(view, error, domain):
+    # view is a ViewMetadata
+    dataset_info = {
+        "Unique ID": view.id,
+        "Dataset Name": view.name,
+        "Type": view.asset_type,
+        "Initial Upload Date": view.created_at,
+        "Last Update": view.updated_at,
+        "Dataset Owner": view.owner,
+        "Derived View": view.view_type,
+        "Parent UID": view.parent_uid,
+        "Dataset link": metadata_url(domain, view.id or ""),
+        "Domain": domain,
+        "error": error
+    }
+    return dataset_info
+
+
+def to_datetimes(values):
+    # Epoch seconds, or date strings (ISO 8601) for values that are not numbers -> UTC datetimes;
+    # anything that parses as neither becomes NaT
+    numeric = pd.to_numeric(values, errors="coerce")
+    dates = pd.to_datetime(numeric, unit="s", utc=True)
+    text = values.notna() & numeric.isna()
+    if text.any():
+        parsed = pd.to_datetime(values.where(text), utc=True, errors="coerce", format="mixed")
+        dates = dates.where(~text, parsed)
+    return dates
+
+
+def to_epoch_seconds(value):
+    # One value by the rules of to_datetimes -> epoch seconds, or None when it parses as neither
+    if value is None:
+        return None
+    try:
+        seconds = float(value)
+        return seconds if math.isfinite(seconds) else None
+    except (TypeError, ValueError):
+        pass
+    try:
+        # Much faster than pandas for the usual ISO 8601 forms
+        date = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        date = pd.to_datetime(value, utc=True, errors="coerce", format="mixed")
+        return None if pd.isna(date) else date.timestamp()
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date.timestamp()
+
+
+def results_frame(rows):
+    # Collects the rows into one buffer per column, then converts each column
+    # in bulk: datetimes, categoricals, nullable integers and strings
+    columns = list(result_columns)
+    columns.extend(column for column in optional_columns if any(column in row for row in rows))
+    buffers = {column: [row.get(column) for row in rows] for column in columns}
+
+    frame = {}
+    for column, values in buffers.items():
+        values = pd.Series(values, dtype=object)
+        if column in date_columns:
+            frame[column] = to_datetimes(values)
+        elif column in category_columns:
+            frame[column] = values.astype("category")
+        elif column in integer_columns:
+            frame[column] = pd.to_numeric(values).astype("Int64")
+        else:
+            frame[column] = values.astype("string")
+    df = pd.DataFrame(frame)
+    df["Last Update"] = df["Last Update"].fillna(df["Initial Upload Date"])  # Use created date if indexUpdatedAt is missing
+    return df
+
+
+class MetadataFetcher:
+    def __init__(
+        self,
+        app_token=None,
+        cache=None,
+        pool_size=pool_size,
+        max_concurrency=max_concurrency,
+        use_bulk_lookup=use_bulk_lookup,
+        bulk_chunk_size=bulk_chunk_size,
+        base_url=None,
+        trace_configs=None,
+        telemetry=None,
+        mirror=None,
+        offline=False,
+        revalidate=False
+    ):
+        # base_url points bulk lookups at a local stub server instead of the portal;
+        # trace_configs are aiohttp TraceConfigs attached to every session;
+        # telemetry (a telemetry.Telemetry) collects request spans and run counters;
+        # mirror (a catalog_mirror.CatalogMirror) answers lookups before the portal,
+        # and with offline=True anything it does not have becomes a Fetch error row;
+        # revalidate=True checks even fresh cache entries with the portal
+        self.app_token = app_token
+        self.cache = cache
+        self.pool_size = pool_size
+        self.max_concurrency = max_concurrency
+        self.use_bulk_lookup = use_bulk_lookup
+        self.bulk_chunk_size = bulk_chunk_size
+        self.base_url = base_url
+        self.trace_configs = trace_configs
+        self.telemetry = telemetry
+        self.mirror = mirror
+        self.offline = offline
+        self.revalidate = revalidate
+
+    def mirrored(self, urls):
+        # {url: ViewMetadata} for the URLs the catalog mirror has
+        if self.mirror is None:
+            return {}
+        urls_by_domain = {}
+        for url in urls:
+            domain, dataset_id = cache_key(url)
+            urls_by_domain.setdefault(domain, {}).setdefault(dataset_id, []).append(url)
+        found = {}
+        for domain, urls_by_id in urls_by_domain.items():
+            for dataset_id, view in self.mirror.get_many(domain, urls_by_id).items():
+                for url in urls_by_id[dataset_id]:
+                    found[url] = view
+        self.mirror.hits += len(found)
+        return found
+
+    async def fetch(self, client, url):
+        view = self.mirrored([url]).get(url)
+        if view is not None:
+            return view
+        if self.offline:
+            raise FetchError(url, "not in the local catalog mirror")
+        if self.cache is None:
+            return (await client.get(url, decode=decode_view)).data
+        return await fetch_with_cache(client, url, self.cache, self.revalidate)
+
+    async def fetch_dataset_info(self, client, url, error):
+        domain, dataset_id = cache_key(url)
+        try:
+            data = await self.fetch(client, url)
+        except FetchError as e:
+            # Keep the dataset in the results with the reason its lookup failed
+            dataset_info = build_dataset_info(ViewMetadata(dataset_id), error, domain)
+            dataset_info["Fetch error"] = str(e)
+            return dataset_info
+        return build_dataset_info(data, error, domain)
+
+    async def fetch_dataset_infos_bulk(self, client, records):
+        # One batch request per chunk; IDs the batch misses fall back to per-ID GETs
+        found = self.mirrored(url for url, error in records)
+        if not self.offline:
+            found.update(await fetch_metadata_bulk(
+                client, [url for url, error in records if url not in found], self.cache, self.base_url,
+                self.bulk_chunk_size, self.revalidate
+            ))
+        rows = [build_dataset_info(found[url], error, cache_key(url)[0]) for url, error in records if url in found]
+        fallbacks = [self.fetch_dataset_info(client, url, error) for url, error in records if url not in found]
+        return rows + list(await asyncio.gather(*fallbacks))
+
+    def open_session(self):
+        # One shared session per run so every request reuses the same keep-alive connections
+        trace_configs = list(self.trace_configs or [])
+        if self.telemetry is not None:
+            trace_configs.append(self.telemetry.trace_config())
+        return open_session(self.pool_size, trace_configs)
+
+    async def fetch_all_datasets(self, urls_with_errors, on_batch=None):
+        async with self.open_session() as session:
+            # Rate limiting, retries and the circuit breaker live in the client
+            client = SocrataClient(session, self.app_token)
+
+            async def fetch_row(url, error):
+                return await self.fetch_dataset_info(client, url, error)
+
+            async def fetch_rows(records):
+                return await self.fetch_dataset_infos_bulk(client, records)
+
+            # Workers drain the parsed records as they arrive; on_batch sees rows as they finish
+            if self.use_bulk_lookup:
+                rows = await run_pipeline(
+                    urls_with_errors, fetch_rows, on_batch, workers=self.max_concurrency, chunk_size=self.bulk_chunk_size
+                )
+            else:
+                rows = await run_pipeline(urls_with_errors, fetch_row, on_batch, workers=self.max_concurrency)
+        if self.telemetry is not None:
+            for name, count in client.stats.items():
+                self.telemetry.count(f"http_{name}", count)
+        return rows
+
+    async def fetch_all_domains(self, urls_with_errors, on_batch=None):
+        # Fans records out to one pipeline per portal domain, each with its own
+        # connection pool and concurrency budget, and merges the rows
+        progress = {}
+
+        def domain_progress(domain):
+            def on_domain_batch(rows, done, parsed, parsing_done):
+                progress[domain] = (done, parsed, parsing_done)
+                if on_batch is not None:
+                    on_batch(
+                        rows,
+                        sum(p[0] for p in progress.values()),
+                        sum(p[1] for p in progress.values()),
+                        all(p[2] for p in progress.values())
+                    )
+            return on_domain_batch
+
+        async def run_domain(domain, records):
+            return await self.fetch_all_datasets(records, domain_progress(domain))
+
+        results = await run_fan_out(urls_with_errors, lambda record: cache_key(record[0])[0], run_domain)
+        return [row for rows in results.values() for row in rows]
+
+    def run(self, urls_with_errors, on_batch=None):
+        # Synchronous entry point: returns the list of result rows
+        if self.telemetry is None:
+            return asyncio.run(self.fetch_all_domains(urls_with_errors, on_batch))
+
+        cache_before = (self.cache.hits, self.cache.revalidated, self.cache.misses) if self.cache is not None else None
+        mirror_before = self.mirror.hits if self.mirror is not None else None
+        with self.telemetry.span("stage: fetch"):
+            rows = asyncio.run(self.fetch_all_domains(urls_with_errors, on_batch))
+        self.telemetry.count("datasets_fetched", len(rows))
+        self.telemetry.count("fetch_errors", sum(1 for row in rows if row is not None and "Fetch error" in row))
+        if cache_before is not None:
+            cache_after = (self.cache.hits, self.cache.revalidated, self.cache.misses)
+            names = ["cache_hits", "cache_revalidated", "cache_misses"]
+            for name, before, after in zip(names, cache_before, cache_after):
+                self.telemetry.count(name, after - before)
+        if mirror_before is not None:
+            self.telemetry.count("mirror_hits", self.mirror.hits - mirror_before)
+        return rows
+
+
+def use_metadata_source(fetcher, source, mirror=None, revalidate=False):
+    # Points the fetcher at one of metadata_sources; revalidate refetches cached metadata
+    fetcher.mirror = None if source == "portal" else mirror
+    fetcher.offline = source == "offline"
+    fetcher.revalidate = revalidate
+
+
+def process_reports(
+    fetcher,
+    sources,
+    history=None,
+    full_refresh=False,
+    source="portal",
+    mirror=None,
+    on_batch=None,
+    workers=None,
+    analytics=True
+):
+    # One run over error reports (a list of ReportSource), for the apps and the CLI.
+    # The reports stream into the fetch, each dataset fetched once. With a
+    # RunHistory, only new and changed datasets are fetched and the rest reuse
+    # their stored rows; full_refresh fetches everything and revalidates cached
+    # metadata. Returns a ReportRun.
+    # Imported here: these modules build on this one
+    from error_analytics import ErrorAnalytics
+    from report_index import ReportIndex, parse_workers
+    from run_history import DeltaRun
+
+    use_metadata_source(fetcher, source, mirror, revalidate=full_refresh)
+    if fetcher.cache is not None:
+        fetcher.cache.reset_stats()
+    telemetry = fetcher.telemetry
+    span = telemetry.span if telemetry is not None else lambda name: contextlib.nullcontext()
+
+    report_index = ReportIndex()
+    records = report_index.stream(sources, parse_workers if workers is None else workers)
+    delta = None
+    if history is None:
+        rows = report_index.merge([row for row in fetcher.run(records, on_batch) if row is not None])
+    else:
+        delta = DeltaRun(history, full_refresh=full_refresh)
+        fetched = fetcher.run(delta.filter(records), on_batch)
+        with span("stage: history diff"):
+            rows = delta.finish(fetched, report_index.merge)
+
+    aggregated = None
+    if analytics:
+        with span("stage: analytics"):
+            aggregated = ErrorAnalytics().add(rows)
+    cache = fetcher.cache
+    cache_stats = (cache.hits, cache.revalidated, cache.misses) if cache is not None else None
+    return ReportRun(rows, aggregated, report_index.stats, delta, cache_stats)
@@ -0,0 +1,145 @@
+import multiprocessing
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from metadata_cache import cache_key
+from metadata_pipeline import record_url
+from report_parser import iter_report, new_parse_stats, parse_report
+
+# Merges one or more error reports into an index of unique datasets.
+# Reports are read lazily and every error line is filed under its dataset
+# (domain + dataset ID) as it is parsed. stream() hands each dataset to the
+# fetch stage the first time a report lists it, so fetching starts with the
+# first lines and memory stays flat; a dataset listed again, within one
+# report or across reports, is not fetched twice. Once the fetch is done,
+# merge() gives every row all of its distinct errors and the lines that
+# listed it. Once several reports are big enough to pay for worker start-up,
+# the first is streamed while the others are parsed in parallel worker
+# processes. build_index() parses everything up front instead.
+
+parse_workers = min(8, os.cpu_count() or 1)
+parallel_min_bytes = 8 * 1024 * 1024  # Smaller inputs are parsed in-process
+error_separator = " | "  # Between a dataset's distinct errors in the "error" column
+
+# content is a file path, the report's bytes or a binary stream; default_domain resolves bare dataset IDs
+ReportSource = namedtuple("ReportSource", ["name", "content", "default_domain"])
+
+ErrorLine = namedtuple("ErrorLine", ["source", "line_number", "error"])
+
+
+def source_size(source):
+    if isinstance(source.content, bytes):
+        return len(source.content)
+    if hasattr(source.content, "read"):
+        return source.content.seek(0, os.SEEK_END)
+    return os.path.getsize(source.content)
+
+
+def worker_content(content):
+    # Worker processes are handed a path or bytes; a stream (an upload) is read whole
+    if hasattr(content, "read"):
+        content.seek(0)
+        return content.read()
+    return content
+
+
+def parse_sources(sources, workers=parse_workers):
+    # Yields (source, records, stats) per source, in the order given. In-process,
+    # records is a lazy iterator and stats is complete once it has been consumed.
+    # For large multi-report inputs, the first report is still read that way, so
+    # its records come at once, while the others are parsed meanwhile in worker
+    # processes; their records come as lists.
+    if workers > 1 and len(sources) > 1 and sum(source_size(source) for source in sources) >= parallel_min_bytes:
+        # Spawned rather than forked: the Streamlit server is multi-threaded
+        context = multiprocessing.get_context("spawn")
+        first, rest = sources[0], sources[1:]
+        with ProcessPoolExecutor(max_workers=min(workers, len(rest)), mp_context=context) as executor:
+            parsed = [executor.submit(parse_report, worker_content(source.content)) for source in rest]
+            stats = new_parse_stats()
+            yield first, iter_report(first.content, stats), stats
+            for source, future in zip(rest, parsed):
+                records, stats = future.result()
+                yield source, records, stats
+    else:
+        for source in sources:
+            stats = new_parse_stats()
+            yield source, iter_report(source.content, stats), stats
+
+
+class ReportIndex:
+    def __init__(self):
+        self.urls = {}  # (domain, dataset_id) -> metadata url of its first line
+        self.lines = {}  # (domain, dataset_id) -> [ErrorLine, ...]
+        self.stats = new_parse_stats()
+        self.stats["duplicates"] = 0  # Lines for a dataset already listed
+
+    def file(self, source, record):
+        # Files one error line; returns the dataset's metadata url the first time it is seen, else None
+        url = record_url(record.identifier, source.default_domain)
+        key = cache_key(url)
+        line = ErrorLine(source.name, record.line_number, record.error)
+        if key in self.lines:
+            self.stats["duplicates"] += 1
+            self.lines[key].append(line)
+            return None
+        self.urls[key] = url
+        self.lines[key] = [line]
+        return url
+
+    def add_stats(self, source, stats, prefix_lines=False):
+        # prefix_lines labels malformed line numbers with the report name,
+        # for when several reports are merged
+        self.stats["lines"] += stats["lines"]
+        self.stats["records"] += stats["records"]
+        self.stats["malformed"].extend(
+            f"{source.name}:{line_number}" if prefix_lines else line_number for line_number in stats["malformed"]
+        )
+
+    def add(self, source, records, stats, prefix_lines=False):
+        for record in records:
+            self.file(source, record)
+        self.add_stats(source, stats, prefix_lines)
+
+    def stream(self, sources, workers=parse_workers):
+        # Yields (metadata url, error of its first line) per dataset, the first
+        # time a report lists it, while the reports are being read
+        for source, records, stats in parse_sources(sources, workers):
+            for record in records:
+                url = self.file(source, record)
+                if url is not None:
+                    yield url, record.error
+            self.add_stats(source, stats, prefix_lines=len(sources) > 1)
+
+    def error(self, key):
+        # A dataset's distinct errors, in report order
+        errors = list(dict.fromkeys(line.error for line in self.lines[key] if line.error))
+        return error_separator.join(errors)
+
+    def records(self):
+        # One (metadata url, merged error) per unique dataset, once the index is built
+        for key, url in self.urls.items():
+            yield url, self.error(key)
+
+    def merge(self, rows):
+        # Sets "error" to the dataset's merged errors and adds "Error Count" and
+        # "Error Lines" (report:line, ...) to fetched rows
+        for row in rows:
+            if row is None:
+                continue
+            key = (row["Domain"], row["Unique ID"])
+            lines = self.lines.get(key)
+            if lines is None:
+                continue
+            row["error"] = self.error(key)
+            row["Error Count"] = len(lines)
+            row["Error Lines"] = ", ".join(f"{line.source}:{line.line_number}" for line in lines)
+        return rows
+
+
+def build_index(sources, workers=parse_workers):
+    # The whole index up front, for callers that need every dataset before fetching
+    index = ReportIndex()
+    for source, records, stats in parse_sources(sources, workers):
+        index.add(source, records, stats, prefix_lines=len(sources) > 1)
+    return index
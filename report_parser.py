@@ -0,0 +1,105 @@
+import codecs
+import contextlib
+import io
+import re
+from collections import namedtuple
+
+# Streaming parser for the error-report TXT exports.
+# The report is read chunk by chunk and each line is matched once against a
+# compiled pattern, so memory stays flat however large the upload is.
+
+chunk_size = 1024 * 1024  # Bytes read from the upload per step
+
+# "... Identifier: <url>; Title: <title> ... Found. <error>"
+line_pattern = re.compile(
+    r"Identifier:(?P<identifier>.*?); Title:(?P<title>.*?)(?:Found\.(?P<error>.*))?$"
+)
+
+ErrorRecord = namedtuple("ErrorRecord", ["line_number", "identifier", "title", "error"])
+
+
+def new_parse_stats():
+    return {"lines": 0, "records": 0, "malformed": []}
+
+
+def iter_lines(stream, encoding="utf-8"):
+    # Accepts binary uploads (Streamlit UploadedFile, open(..., "rb")) and text files
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    pending = ""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk)
+        lines = (pending + chunk).split("\n")
+        pending = lines.pop()
+        yield from lines
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def parse_line(line, line_number=0):
+    # Returns an ErrorRecord, or None when the line does not describe a dataset.
+    # A record whose error is None had an identifier but no "Found." marker.
+    if "Identifier:" not in line:
+        return None
+    match = line_pattern.search(line.rstrip("\r\n"))
+    if match is None:
+        return None
+    error = match.group("error")
+    return ErrorRecord(
+        line_number,
+        match.group("identifier").strip(),
+        match.group("title").strip().rstrip(";").strip(),
+        error.strip() if error is not None else None
+    )
+
+
+def iter_error_records(stream, stats=None, encoding="utf-8"):
+    # Lazily yields one ErrorRecord per dataset line. Malformed lines (an
+    # "Identifier:" without "; Title:" or without "Found.") are recorded in
+    # stats["malformed"] by line number; the latter still yield a record with
+    # an empty error so the dataset is not dropped.
+    if stats is None:
+        stats = new_parse_stats()
+    for line_number, line in enumerate(iter_lines(stream, encoding), start=1):
+        stats["lines"] += 1
+        if "Identifier:" not in line:
+            continue
+        record = parse_line(line, line_number)
+        if record is None or not record.identifier:
+            stats["malformed"].append(line_number)
+            continue
+        if record.error is None:
+            stats["malformed"].append(line_number)
+            record = record._replace(error="")
+        stats["records"] += 1
+        yield record
+
+
+def open_report(source):
+    # A report given as a file path, its bytes or a binary stream (a Streamlit
+    # UploadedFile); streams are read from the start and left open
+    if isinstance(source, bytes):
+        return io.BytesIO(source)
+    if hasattr(source, "read"):
+        source.seek(0)
+        return contextlib.nullcontext(source)
+    return open(source, "rb")
+
+
+def iter_report(source, stats=None, encoding="utf-8"):
+    # Lazily yields the ErrorRecords of one report, reading it chunk by chunk
+    with open_report(source) as stream:
+        yield from iter_error_records(stream, stats, encoding)
+
+
+def parse_report(source, encoding="utf-8"):
+    # Parses a whole report, given as a file path or the report's bytes, and
+    # returns (list of ErrorRecords, stats). Picklable both ways, so it can
+    # run in a worker process.
+    stats = new_parse_stats()
+    records = list(iter_report(source, stats, encoding))
+    return records, stats
@@ -0,0 +1,263 @@
+import json
+import sqlite3
+import threading
+import time
+
+from metadata_cache import cache_key
+from report_index import error_separator
+
+# Local history of previous runs, for incremental (delta) runs.
+# The latest known state of every dataset (its error and fetched metadata
+# row) is kept per domain + dataset ID. A new report is diffed against it
+# while it streams in: only new and changed entries go on to be fetched,
+# unchanged ones reuse the stored row and datasets missing from the new
+# report are marked resolved. Every run also leaves a summary row behind
+# for trend charts.
+
+default_history_path = "run_history.sqlite"
+
+# Values of the "Change" column
+change_new = "new"  # Not in the previous run (or resolved since)
+change_changed = "changed"  # Same dataset, different error text
+change_unchanged = "unchanged"
+change_resolved = "resolved"  # In the previous run, missing from this one
+
+
+class RunHistory:
+    def __init__(self, path=default_history_path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                domain TEXT NOT NULL,
+                dataset_id TEXT NOT NULL,
+                error TEXT,
+                row TEXT,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL,
+                runs_seen INTEGER NOT NULL,
+                resolved_at REAL,
+                PRIMARY KEY (domain, dataset_id)
+            )
+            """
+        )
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                finished_at REAL NOT NULL,
+                domains TEXT NOT NULL,
+                errors INTEGER NOT NULL,
+                new INTEGER NOT NULL,
+                changed INTEGER NOT NULL,
+                unchanged INTEGER NOT NULL,
+                resolved INTEGER NOT NULL,
+                fetched INTEGER NOT NULL
+            )
+            """
+        )
+        self.conn.commit()
+
+    def get(self, domain, dataset_id):
+        # Returns the stored entry or None
+        with self.lock:
+            row = self.conn.execute(
+                """
+                SELECT error, row, first_seen, runs_seen, resolved_at FROM entries
+                WHERE domain = ? AND dataset_id = ?
+                """,
+                (domain, dataset_id)
+            ).fetchone()
+        if row is None:
+            return None
+        error, body, first_seen, runs_seen, resolved_at = row
+        return {
+            "error": error,
+            "row": json.loads(body) if body is not None else None,
+            "first_seen": first_seen,
+            "runs_seen": runs_seen,
+            "resolved_at": resolved_at
+        }
+
+    def open_entries(self, domains):
+        # Unresolved entries of the given domains, as {(domain, dataset_id): (error, row)}
+        placeholders = ", ".join("?" for domain in domains)
+        with self.lock:
+            rows = self.conn.execute(
+                f"""
+                SELECT domain, dataset_id, error, row FROM entries
+                WHERE resolved_at IS NULL AND domain IN ({placeholders})
+                """,
+                list(domains)
+            ).fetchall()
+        return {
+            (domain, dataset_id): (error, json.loads(body) if body is not None else None)
+            for domain, dataset_id, error, body in rows
+        }
+
+    def record(self, rows, resolved_keys, counts, domains):
+        # rows: this run's result rows, each with "Domain", "Unique ID",
+        # "error", "First Seen" and "Runs Seen" set. Rows with a "Fetch error"
+        # are stored without metadata so the next run fetches them again.
+        now = time.time()
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, NULL)",
+                [
+                    (
+                        row["Domain"],
+                        row["Unique ID"],
+                        row["error"],
+                        None if "Fetch error" in row else json.dumps(stored_row(row)),
+                        row["First Seen"],
+                        now,
+                        row["Runs Seen"]
+                    )
+                    for row in rows
+                ]
+            )
+            self.conn.executemany(
+                "UPDATE entries SET resolved_at = ? WHERE domain = ? AND dataset_id = ?",
+                [(now, domain, dataset_id) for domain, dataset_id in resolved_keys]
+            )
+            self.conn.execute(
+                """
+                INSERT INTO runs (finished_at, domains, errors, new, changed, unchanged, resolved, fetched)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    now,
+                    ",".join(sorted(domains)),
+                    len(rows),
+                    counts[change_new],
+                    counts[change_changed],
+                    counts[change_unchanged],
+                    counts[change_resolved],
+                    counts["fetched"]
+                )
+            )
+            self.conn.commit()
+
+    def trend(self, limit=90):
+        # Run summaries, oldest first
+        with self.lock:
+            rows = self.conn.execute(
+                """
+                SELECT finished_at, domains, errors, new, changed, unchanged, resolved, fetched
+                FROM runs ORDER BY run_id DESC LIMIT ?
+                """,
+                (limit,)
+            ).fetchall()
+        columns = ["Run", "Domains", "Errors", "New", "Changed", "Unchanged", "Resolved", "Fetched"]
+        return [dict(zip(columns, row)) for row in reversed(rows)]
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM entries")
+            self.conn.execute("DELETE FROM runs")
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+# Rebuilt from the report and the history on every run, so not stored with the metadata
+report_columns = ("Change", "First Seen", "Runs Seen", "Error Count", "Error Lines")
+
+
+def first_error(error):
+    # While a report streams in, only the first of a dataset's errors is known
+    return (error or "").split(error_separator, 1)[0]
+
+
+def stored_row(row):
+    # The metadata part of a result row; the history columns are rebuilt per run
+    return {column: value for column, value in row.items() if column not in report_columns}
+
+
+class DeltaRun:
+    # One run diffed against the history:
+    #
+    #   delta = DeltaRun(history)
+    #   rows = delta.finish(fetcher.run(delta.filter(report_index.stream(sources))), report_index.merge)
+    #
+    # filter() passes through the (url, error) records that need fetching and
+    # keeps the reused rows aside. Records may carry only a dataset's first
+    # error (streamed reports), so a stored row is reused when its first error
+    # matches. finish() merges both, lets merge fill in the full errors, adds
+    # the Change / First Seen / Runs Seen columns, records the run and
+    # collects the resolved rows in delta.resolved. full_refresh fetches every
+    # record but still diffs and records it.
+    def __init__(self, history, full_refresh=False):
+        self.history = history
+        self.full_refresh = full_refresh
+        self.started = time.time()
+        self.previous = {}  # (domain, dataset_id) -> stored entry, for fetched records
+        self.reused = []
+        self.domains = set()
+        self.resolved = []
+        self.counts = dict.fromkeys([change_new, change_changed, change_unchanged, change_resolved, "fetched"], 0)
+
+    def filter(self, records):
+        for url, error in records:
+            key = cache_key(url)
+            self.domains.add(key[0])
+            entry = self.history.get(*key)
+            if entry is not None and entry["resolved_at"] is not None:
+                entry = None  # Came back after being resolved: a new error again
+            self.previous[key] = entry
+            if (
+                not self.full_refresh
+                and entry is not None
+                and entry["row"] is not None
+                and first_error(entry["error"]) == first_error(error)
+            ):
+                self.reused.append(dict(entry["row"], error=error))
+                continue
+            self.counts["fetched"] += 1
+            yield url, error
+
+    def history_row(self, row, error, entry, change):
+        row = dict(row)
+        row["error"] = error
+        row["Change"] = change
+        row["First Seen"] = entry["first_seen"] if entry is not None else self.started
+        row["Runs Seen"] = entry["runs_seen"] + 1 if entry is not None else 1
+        return row
+
+    def finish(self, fetched_rows, merge=None):
+        # merge(rows), e.g. ReportIndex.merge, completes the rows' errors before they are compared
+        merged = self.reused + [row for row in fetched_rows if row is not None]
+        if merge is not None:
+            merged = merge(merged)
+        rows = []
+        for row in merged:
+            key = (row["Domain"], row["Unique ID"])
+            entry = self.previous.get(key)
+            if entry is None:
+                change = change_new
+            elif entry["error"] != row["error"]:
+                change = change_changed
+            else:
+                change = change_unchanged
+            rows.append(self.history_row(row, row["error"], entry, change))
+        for row in rows:
+            self.counts[row["Change"]] += 1
+
+        # Anything still open in these domains that this report no longer lists
+        seen = {(row["Domain"], row["Unique ID"]) for row in rows}
+        open_entries = self.history.open_entries(self.domains) if self.domains else {}
+        resolved_keys = [key for key in open_entries if key not in seen]
+        for key in resolved_keys:
+            error, row = open_entries[key]
+            resolved_row = dict(row or {"Unique ID": key[1], "Domain": key[0]})
+            resolved_row["error"] = error
+            resolved_row["Change"] = change_resolved
+            self.resolved.append(resolved_row)
+        self.counts[change_resolved] = len(resolved_keys)
+
+        self.history.record(rows, resolved_keys, self.counts, self.domains)
+        return rows
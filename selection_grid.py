@@ -0,0 +1,76 @@
+import math
+
+import numpy as np
+import streamlit as st
+
+# One editable grid with a Select column, in place of one st.checkbox per row.
+# Filtering, sorting and pagination happen on the server, so only one page of
+# rows is ever sent to the browser. The selection is remembered by DataFrame
+# index in session state, across pages, filters and sort orders.
+
+default_page_size = 100
+
+
+def forget_grids(key, keep=None):
+    # Drops the edits the data editors of other views hold, so none is replayed
+    # onto a selection that changed since the view was last shown
+    prefix = f"{key}_grid_"
+    for name in [name for name in st.session_state if str(name).startswith(prefix) and name != keep]:
+        del st.session_state[name]
+
+
+def selection_grid(df, key, page_size=default_page_size):
+    # Renders the grid and returns the selected rows of df
+    selected = st.session_state.setdefault(f"{key}_selected", set())
+
+    filter_col, sort_col, order_col, page_col = st.columns([3, 2, 1, 1])
+    query = filter_col.text_input("Filter", key=f"{key}_filter", placeholder="Search any column")
+    sort_by = sort_col.selectbox("Sort by", ["(report order)"] + list(df.columns), key=f"{key}_sort")
+    descending = order_col.toggle("Descending", key=f"{key}_descending")
+
+    view = df
+    if query:
+        matches = [
+            df[column].astype(str).str.contains(query, case=False, regex=False, na=False)
+            for column in df.columns
+        ]
+        view = view[np.logical_or.reduce(matches)]
+    if sort_by != "(report order)":
+        view = view.sort_values(sort_by, ascending=not descending, kind="stable")
+
+    pages = max(1, math.ceil(len(view) / page_size))
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = pages  # The filter left fewer pages than we were on
+    page = page_col.number_input("Page", min_value=1, max_value=pages, key=f"{key}_page")
+    page_rows = view.iloc[(page - 1) * page_size:page * page_size]
+
+    grid = page_rows.copy()
+    grid.insert(0, "Select", grid.index.isin(selected))
+    # A new editor key per view, so edits are never replayed onto different rows
+    view_key = f"{key}_grid_{hash((query, sort_by, descending, page))}"
+    forget_grids(key, keep=view_key)
+    edited = st.data_editor(
+        grid,
+        key=view_key,
+        disabled=[column for column in grid.columns if column != "Select"],
+        column_config={"Select": st.column_config.CheckboxColumn("Select")}
+    )
+    # Only the ticks changed against what was rendered count
+    for index, was_selected, is_selected in zip(grid.index, grid["Select"], edited["Select"]):
+        if is_selected == was_selected:
+            continue
+        if is_selected:
+            selected.add(index)
+        else:
+            selected.discard(index)
+
+    info_col, clear_col = st.columns([4, 1])
+    info_col.caption(
+        f"{len(view)} of {len(df)} datasets match - page {page} of {pages} - {len(selected)} selected"
+    )
+    if clear_col.button("Clear selection", key=f"{key}_clear"):
+        selected.clear()
+        forget_grids(key)  # Forget the ticks held by the editors themselves
+        st.rerun()
+
+    return df[df.index.isin(selected)]
@@ -0,0 +1,135 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+
+from selenium_steps import SessionExpired, login_steps, run_steps
+
+# Pool of long-lived, logged-in headless Chrome drivers.
+# Browsers are started and logged in once, handed out to worker threads for
+# bulk description updates, health-checked before reuse and logged in again
+# when the Socrata session has expired.
+
+default_pool_size = 4
+
+
+@lru_cache(maxsize=None)
+def chromedriver_path():
+    # ChromeDriverManager hits the network; resolve the binary once per process
+    return ChromeDriverManager().install()
+
+
+def new_driver(headless=True):
+    options = Options()
+    if headless:
+        options.add_argument("--headless=new")  # Drop this to watch the browser
+    return webdriver.Chrome(service=Service(chromedriver_path()), options=options)
+
+
+def login_driver(driver, base_url, email, password):
+    run_steps(driver, login_steps(base_url, email, password))
+
+
+def is_logged_out(driver):
+    return "/login" in driver.current_url
+
+
+class DriverPool:
+    def __init__(self, base_url, email, password, size=default_pool_size, headless=True):
+        self.base_url = base_url
+        self.email = email
+        self.password = password
+        self.size = size
+        self.headless = headless
+        self.idle = queue.Queue()
+        self.started = 0
+        self.lock = threading.Lock()
+
+    def _start_driver(self):
+        driver = new_driver(self.headless)
+        try:
+            login_driver(driver, self.base_url, self.email, self.password)
+        except Exception:
+            driver.quit()
+            raise
+        return driver
+
+    def _healthy(self, driver):
+        try:
+            driver.current_url  # Raises once the browser or its session is gone
+            return True
+        except WebDriverException:
+            return False
+
+    def acquire(self):
+        # Reuse an idle driver, start a new one while below size, else wait
+        with self.lock:
+            start_new = self.idle.empty() and self.started < self.size
+            if start_new:
+                self.started += 1
+        if start_new:
+            try:
+                return self._start_driver()
+            except Exception:
+                with self.lock:
+                    self.started -= 1
+                raise
+        driver = self.idle.get()
+        if not self._healthy(driver):
+            self.discard(driver)
+            return self.acquire()
+        return driver
+
+    def release(self, driver):
+        self.idle.put(driver)
+
+    def discard(self, driver):
+        with self.lock:
+            self.started -= 1
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+
+    def run_task(self, task, item):
+        # task(driver, item) runs on a logged-in driver; if the session expired
+        # we log in again and retry once
+        driver = self.acquire()
+        try:
+            try:
+                result = task(driver, item)
+            except SessionExpired:
+                login_driver(driver, self.base_url, self.email, self.password)
+                result = task(driver, item)
+        except Exception:
+            if not self._healthy(driver):
+                self.discard(driver)
+                driver = None
+            raise
+        finally:
+            if driver is not None:
+                self.release(driver)
+        return result
+
+    def map(self, task, items):
+        # Runs task over items in parallel across the pool.
+        # Returns [(item, exception_or_None)] in input order.
+        def run(item):
+            try:
+                self.run_task(task, item)
+                return item, None
+            except Exception as e:
+                return item, e
+
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            return list(executor.map(run, items))
+
+    def close(self):
+        while not self.idle.empty():
+            self.discard(self.idle.get())
@@ -0,0 +1,140 @@
+import time
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+# Re-exported so browser code can keep importing the whole step API from here
+from step_runner import SessionExpired, Step, StepFailed, StepStats, run_steps, step_stats  # noqa: F401
+
+# Browser flows (login, description update) as explicit step machines.
+# Each step waits on page signals instead of fixed sleeps: element conditions,
+# document.readyState, a quiet DOM (MutationObserver) and a quiet network
+# (no new resource-timing entries). Step timeouts adapt to observed latencies
+# and every step's duration is recorded in a histogram.
+
+quiet_period = 0.5  # Seconds without DOM mutations / new requests that count as settled
+
+page_signals_script = """
+if (!window.__stepObserver) {
+    window.__lastMutation = performance.now();
+    window.__stepObserver = new MutationObserver(function () { window.__lastMutation = performance.now(); });
+    window.__stepObserver.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+}
+return [document.readyState, performance.now() - window.__lastMutation, performance.getEntriesByType('resource').length];
+"""
+
+
+class page_settled:
+    # WebDriverWait condition: document loaded, no DOM mutations and no new
+    # network requests for quiet_period seconds
+    def __init__(self, quiet=quiet_period):
+        self.quiet = quiet
+        self.resources = None
+        self.resources_since = None
+
+    def __call__(self, driver):
+        ready_state, ms_since_mutation, resources = driver.execute_script(page_signals_script)
+        now = time.monotonic()
+        if resources != self.resources:
+            self.resources = resources
+            self.resources_since = now
+        return (
+            ready_state == "complete"
+            and ms_since_mutation >= self.quiet * 1000
+            and now - self.resources_since >= self.quiet
+        )
+
+
+def wait_settled(driver, timeout):
+    WebDriverWait(driver, timeout, poll_frequency=0.1).until(page_settled())
+
+
+def wait_clickable(driver, timeout, xpath):
+    return WebDriverWait(driver, timeout, poll_frequency=0.1).until(
+        EC.element_to_be_clickable((By.XPATH, xpath))
+    )
+
+
+def wait_visible(driver, timeout, xpath):
+    return WebDriverWait(driver, timeout, poll_frequency=0.1).until(
+        EC.visibility_of_element_located((By.XPATH, xpath))
+    )
+
+
+def login_steps(base_url, email, password):
+    def open_login(driver, timeout):
+        driver.get(f"{base_url}/login")
+        wait_settled(driver, timeout)
+
+    def fill_email(driver, timeout):
+        wait_visible(driver, timeout, "//input[@name='user_session[login]']").send_keys(email)
+
+    def fill_password(driver, timeout):
+        wait_visible(driver, timeout, "//input[@name='user_session[password]']").send_keys(password)
+
+    def sign_in(driver, timeout):
+        wait_clickable(driver, timeout, "//div[@class='btn-content' and text()='Sign In']").click()
+        WebDriverWait(driver, timeout, poll_frequency=0.1).until(lambda d: "/login" not in d.current_url)
+
+    return [
+        Step("login: open page", open_login),
+        Step("login: email", fill_email),
+        Step("login: password", fill_password),
+        Step("login: sign in", sign_in)
+    ]
+
+
+def update_description_steps(base_url, dataset_id, new_description):
+    def open_browse(driver, timeout):
+        driver.get(f"{base_url}/browse")
+        if "/login" in driver.current_url:
+            raise SessionExpired()
+
+    def search(driver, timeout):
+        search_field = wait_visible(driver, timeout, "//input[@aria-label='Search']")
+        search_field.send_keys(dataset_id)
+        search_field.send_keys(Keys.ENTER)
+
+    def open_dataset(driver, timeout):
+        wait_clickable(driver, timeout, f"//a[contains(@href, '{dataset_id}')]").click()
+
+    def edit(driver, timeout):
+        wait_clickable(driver, timeout, "//span[@class='forge-button__ripple']").click()
+
+    def edit_metadata(driver, timeout):
+        wait_clickable(driver, timeout, "//div[@class='btn-content']").click()
+
+    def fill_description(driver, timeout):
+        description_textbox = wait_visible(driver, timeout, "//textarea[@name='Brief description']")
+        description_textbox.clear()
+        description_textbox.send_keys(new_description)
+
+    def save(driver, timeout):
+        wait_clickable(driver, timeout, "//button[contains(., 'Save')]").click()
+
+    def wait_saved(driver, timeout):
+        # Replaces the old fixed 5 second sleep
+        wait_settled(driver, timeout)
+
+    def confirm_update(driver, timeout):
+        wait_clickable(driver, timeout, "//span[@class='forge-button__ripple']").click()
+
+    def post(driver, timeout):
+        wait_clickable(
+            driver, timeout, "//button[contains(@class, 'btn btn-primary continue-button false')]"
+        ).click()
+
+    return [
+        Step("update: open browse", open_browse),
+        Step("update: search", search),
+        Step("update: open dataset", open_dataset),
+        Step("update: edit", edit),
+        Step("update: edit metadata", edit_metadata),
+        Step("update: description", fill_description),
+        Step("update: save", save),
+        Step("update: wait for save", wait_saved),
+        Step("update: confirm", confirm_update),
+        Step("update: post", post)
+    ]
@@ -0,0 +1,224 @@
+import asyncio
+import random
+import re
+import time
+from collections import namedtuple
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import aiohttp
+
+from metadata_decode import decode_body, loads
+
+# Resilient HTTP layer for Socrata metadata requests (GETs and the PATCHes
+# of description updates).
+# Every request goes through a per-domain token bucket (tuned by whether we
+# have an app token, halved on 429 and slowly raised again on success), a
+# per-request timeout, retries with exponential backoff + jitter that honour
+# Retry-After, and a circuit breaker per domain and endpoint that fails fast
+# while a portal (or one of its APIs, e.g. the views.json batch endpoint) is
+# down. Callers get a FetchError instead of an exception from deep
+# inside aiohttp, so a failed ID can become an error row.
+
+rate_with_app_token = 20.0  # Starting requests/second per domain
+rate_without_app_token = 2.0
+min_rate = 0.5
+rate_increase = 0.2  # Added to the rate after each success (additive increase)
+rate_decrease = 0.5  # Rate multiplier after a 429 (multiplicative decrease)
+request_timeout = 30  # Seconds per attempt
+max_retries = 4
+backoff_base = 0.5  # Seconds; attempt n waits up to backoff_base * 2**n
+backoff_max = 30
+breaker_threshold = 10  # Consecutive failures before a domain's circuit opens
+breaker_cooldown = 30  # Seconds an open circuit rejects requests
+
+retry_statuses = {429, 500, 502, 503, 504}
+dataset_id_pattern = re.compile(r"/[a-z0-9]{4}-[a-z0-9]{4}(?=\.json$|$)")  # Per-dataset path segment
+keepalive_timeout = 30  # Seconds an idle connection stays open for reuse
+
+FetchResult = namedtuple("FetchResult", ["status", "headers", "data"])
+
+
+class FetchError(Exception):
+    def __init__(self, url, message, status=None):
+        super().__init__(f"{message} ({url})")
+        self.url = url
+        self.status = status
+
+
+class TokenBucket:
+    def __init__(self, rate, max_rate=None):
+        self.rate = rate
+        self.max_rate = max_rate or rate
+        self.capacity = max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def throttled(self):
+        self.rate = max(min_rate, self.rate * rate_decrease)
+        self.tokens = min(self.tokens, 0)
+
+    def succeeded(self):
+        self.rate = min(self.max_rate, self.rate + rate_increase)
+
+
+class CircuitBreaker:
+    def __init__(self, threshold=breaker_threshold, cooldown=breaker_cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started = None  # Set while the one half-open trial request is in flight
+
+    def allow(self):
+        # Closed, or open long enough that one trial request may go through (half-open).
+        # Other requests are rejected until the trial succeeds; a trial that never
+        # reports back gives way to a new one after another cooldown.
+        if self.opened_at is None:
+            return True
+        now = time.monotonic()
+        if now - self.opened_at < self.cooldown:
+            return False
+        if self.trial_started is not None and now - self.trial_started < self.cooldown:
+            return False
+        self.trial_started = now
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+            self.trial_started = None
+
+
+def retry_after_seconds(value):
+    # Retry-After is either a number of seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def open_session(pool_size, trace_configs=None):
+    # The connection pool shared by every request of a run (or of an update job)
+    connector = aiohttp.TCPConnector(
+        limit=pool_size,
+        limit_per_host=pool_size,
+        keepalive_timeout=keepalive_timeout,
+        ttl_dns_cache=300
+    )
+    return aiohttp.ClientSession(connector=connector, trace_configs=list(trace_configs or []))
+
+
+def endpoint(url):
+    # (domain, path with the dataset ID left out): requests for different datasets share an endpoint
+    parts = urlparse(url)
+    return parts.netloc.lower(), dataset_id_pattern.sub("/{id}", parts.path)
+
+
+def backoff_delay(attempt):
+    # Full jitter: uniform in [0, min(backoff_max, backoff_base * 2**attempt)]
+    return random.uniform(0, min(backoff_max, backoff_base * 2 ** attempt))
+
+
+class SocrataClient:
+    def __init__(self, session, app_token=None):
+        self.session = session
+        self.headers = {"X-App-Token": app_token} if app_token else {}
+        self.rate = rate_with_app_token if app_token else rate_without_app_token
+        self.buckets = {}
+        self.breakers = {}
+        self.stats = {"requests": 0, "retries": 0, "throttled": 0, "failures": 0}
+
+    def bucket(self, domain):
+        if domain not in self.buckets:
+            self.buckets[domain] = TokenBucket(self.rate)
+        return self.buckets[domain]
+
+    def breaker(self, domain, path=""):
+        # One per endpoint, so a failing batch endpoint does not block the per-ID one
+        if (domain, path) not in self.breakers:
+            self.breakers[domain, path] = CircuitBreaker()
+        return self.breakers[domain, path]
+
+    async def get(self, url, headers=None, params=None, decode=loads):
+        return await self.request("GET", url, headers, params, decode=decode)
+
+    async def request(self, method, url, headers=None, params=None, json=None, decode=loads):
+        # Returns FetchResult(status, headers, data); data is decode(body) (the
+        # decoded JSON by default), or None for 304 Not Modified and 204 No Content.
+        # Raises FetchError once retries run out.
+        domain, path = endpoint(url)
+        bucket = self.bucket(domain)  # Rate limits apply to the whole portal
+        breaker = self.breaker(domain, path)
+        request_headers = {**self.headers, **(headers or {})}
+        timeout = aiohttp.ClientTimeout(total=request_timeout)
+        error = None
+
+        for attempt in range(max_retries + 1):
+            if not breaker.allow():
+                raise FetchError(url, f"circuit open for {domain}{path}")
+            if attempt:
+                self.stats["retries"] += 1
+            await bucket.acquire()
+            self.stats["requests"] += 1
+            delay = backoff_delay(attempt)
+            try:
+                async with self.session.request(
+                    method, url, headers=request_headers, params=params, json=json, timeout=timeout
+                ) as response:
+                    if response.status == 429:
+                        breaker.record_success()  # Throttled, but the portal is up
+                        self.stats["throttled"] += 1
+                        bucket.throttled()
+                        error = FetchError(url, "HTTP 429 Too Many Requests", 429)
+                        delay = retry_after_seconds(response.headers.get("Retry-After")) or delay
+                    elif response.status in retry_statuses:
+                        breaker.record_failure()
+                        error = FetchError(url, f"HTTP {response.status}", response.status)
+                        delay = retry_after_seconds(response.headers.get("Retry-After")) or delay
+                    elif response.status in (204, 304):
+                        breaker.record_success()
+                        bucket.succeeded()
+                        return FetchResult(response.status, response.headers, None)
+                    elif response.status >= 400:
+                        breaker.record_success()  # The portal is up; the request itself is bad
+                        self.stats["failures"] += 1
+                        raise FetchError(url, f"HTTP {response.status}", response.status)
+                    else:
+                        data = await decode_body(await response.read(), decode)
+                        breaker.record_success()
+                        bucket.succeeded()
+                        return FetchResult(response.status, response.headers, data)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                # Connection problems, timeouts and non-JSON bodies are all retried
+                breaker.record_failure()
+                error = FetchError(url, f"{type(e).__name__}: {e}".rstrip(": "))
+            if attempt < max_retries:
+                await asyncio.sleep(min(delay, backoff_max))
+
+        self.stats["failures"] += 1
+        raise error
@@ -0,0 +1,109 @@
+import bisect
+import threading
+import time
+from collections import namedtuple
+
+# Step machines without a browser dependency: the Step type, the step errors,
+# the adaptive-timeout latency stats and run_steps. Kept apart from
+# selenium_steps so the apps can show step timings without importing Selenium.
+
+default_timeout = 10  # Seconds per step until a step has enough samples
+min_timeout = 3
+max_timeout = 30
+timeout_factor = 3  # Adaptive timeout = timeout_factor * p95 of the step
+min_samples = 5
+histogram_buckets = [0.25, 0.5, 1, 2, 5, 10, 30]  # Upper bounds in seconds; one overflow bucket
+
+Step = namedtuple("Step", ["name", "run"])  # run(driver, timeout)
+
+
+class SessionExpired(Exception):
+    pass
+
+
+class StepFailed(Exception):
+    def __init__(self, step, elapsed, cause):
+        super().__init__(f"step '{step}' failed after {elapsed:.1f}s: {cause!r}")
+        self.step = step
+        self.elapsed = elapsed
+        self.cause = cause
+
+
+class StepStats:
+    # Thread-safe per-step latency samples shared by every driver in the pool
+    def __init__(self, max_samples=500):
+        self.max_samples = max_samples
+        self.samples = {}
+        self.failures = {}
+        self.lock = threading.Lock()
+
+    def record(self, step, seconds, failed=False):
+        with self.lock:
+            samples = self.samples.setdefault(step, [])
+            samples.append(seconds)
+            if len(samples) > self.max_samples:
+                del samples[0]
+            if failed:
+                self.failures[step] = self.failures.get(step, 0) + 1
+
+    def percentile(self, step, q):
+        with self.lock:
+            samples = sorted(self.samples.get(step, []))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def timeout_for(self, step):
+        with self.lock:
+            count = len(self.samples.get(step, []))
+        if count < min_samples:
+            return default_timeout
+        return min(max_timeout, max(min_timeout, timeout_factor * self.percentile(step, 0.95)))
+
+    def histogram(self, step):
+        counts = [0] * (len(histogram_buckets) + 1)
+        with self.lock:
+            samples = list(self.samples.get(step, []))
+        for seconds in samples:
+            counts[bisect.bisect_left(histogram_buckets, seconds)] += 1
+        return counts
+
+    def summary(self):
+        # One row per step, in the order steps were first seen
+        rows = []
+        labels = [f"<= {bound}s" for bound in histogram_buckets] + [f"> {histogram_buckets[-1]}s"]
+        for step in list(self.samples):
+            with self.lock:
+                samples = list(self.samples[step])
+                failures = self.failures.get(step, 0)
+            row = {
+                "Step": step,
+                "Count": len(samples),
+                "Failures": failures,
+                "Mean (s)": round(sum(samples) / len(samples), 2),
+                "p50 (s)": round(self.percentile(step, 0.5), 2),
+                "p95 (s)": round(self.percentile(step, 0.95), 2),
+                "Max (s)": round(max(samples), 2),
+                "Timeout (s)": round(self.timeout_for(step), 1)
+            }
+            row.update(zip(labels, self.histogram(step)))
+            rows.append(row)
+        return rows
+
+
+# Shared by the whole process so timeouts keep learning across runs
+step_stats = StepStats()
+
+
+def run_steps(driver, steps, stats=step_stats):
+    for step in steps:
+        started = time.monotonic()
+        try:
+            step.run(driver, stats.timeout_for(step.name))
+        except SessionExpired:
+            raise
+        except Exception as e:
+            elapsed = time.monotonic() - started
+            stats.record(step.name, elapsed, failed=True)
+            raise StepFailed(step.name, elapsed, e) from e
+        stats.record(step.name, time.monotonic() - started)
@@ -0,0 +1,157 @@
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+import aiohttp
+
+# Run instrumentation: timing spans per pipeline stage and per HTTP request
+# (plus the DNS lookup and connection setup inside it) and counters for
+# bytes, retries, cache hits and errors. The apps show it in a "Run
+# diagnostics" panel; the CLI dumps it as JSON or Prometheus text.
+
+quantiles = [0.5, 0.95, 0.99]
+
+
+def percentile(samples, q):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class Telemetry:
+    def __init__(self):
+        self.timings = {}  # span name -> [seconds, ...], in the order spans were first seen
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self.lock:
+            self.timings.setdefault(name, []).append(seconds)
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    @contextmanager
+    def span(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def trace_config(self):
+        # aiohttp hooks: one "http: request" span per request (to response
+        # headers), "http: dns" and "http: connect" spans when a new
+        # connection is opened, and the response bytes read
+        trace = aiohttp.TraceConfig()
+
+        def timer(attribute):
+            async def start(session, context, params):
+                setattr(context, attribute, time.perf_counter())
+            return start
+
+        def recorder(attribute, name):
+            async def end(session, context, params):
+                started = getattr(context, attribute, None)
+                if started is not None:
+                    self.record(name, time.perf_counter() - started)
+            return end
+
+        async def chunk_received(session, context, params):
+            self.count("http_bytes", len(params.chunk))
+
+        trace.on_request_start.append(timer("request_started"))
+        trace.on_request_end.append(recorder("request_started", "http: request"))
+        trace.on_request_exception.append(recorder("request_started", "http: request"))
+        trace.on_dns_resolvehost_start.append(timer("dns_started"))
+        trace.on_dns_resolvehost_end.append(recorder("dns_started", "http: dns"))
+        trace.on_connection_create_start.append(timer("connect_started"))
+        trace.on_connection_create_end.append(recorder("connect_started", "http: connect"))
+        trace.on_response_chunk_received.append(chunk_received)
+        return trace
+
+    def span_stats(self, name):
+        with self.lock:
+            samples = list(self.timings[name])
+        stats = {"count": len(samples), "total": sum(samples), "max": max(samples)}
+        stats.update((f"p{round(q * 100)}", percentile(samples, q)) for q in quantiles)
+        return stats
+
+    def summary(self):
+        # One row per span, for st.dataframe
+        rows = []
+        for name in list(self.timings):
+            stats = self.span_stats(name)
+            row = {"Span": name, "Count": stats["count"], "Total (s)": round(stats["total"], 3)}
+            row.update((f"{key} (ms)", round(stats[key] * 1000, 1)) for key in stats if key.startswith("p"))
+            row["Max (ms)"] = round(stats["max"] * 1000, 1)
+            rows.append(row)
+        return rows
+
+    def as_dict(self):
+        with self.lock:
+            counters = dict(self.counters)
+        return {"spans": {name: self.span_stats(name) for name in list(self.timings)}, "counters": counters}
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), indent=2)
+
+    def to_prometheus(self, prefix="error_pull"):
+        # Prometheus text exposition format: a summary per span, a counter per counter
+        lines = [
+            f"# HELP {prefix}_span_seconds Time spent per pipeline stage and HTTP request.",
+            f"# TYPE {prefix}_span_seconds summary"
+        ]
+        for name, stats in self.as_dict()["spans"].items():
+            label = name.replace("\\", "\\\\").replace('"', '\\"')
+            for q in quantiles:
+                lines.append(f'{prefix}_span_seconds{{span="{label}",quantile="{q}"}} {stats[f"p{round(q * 100)}"]}')
+            lines.append(f'{prefix}_span_seconds_sum{{span="{label}"}} {stats["total"]}')
+            lines.append(f'{prefix}_span_seconds_count{{span="{label}"}} {stats["count"]}')
+        for name, value in self.as_dict()["counters"].items():
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        # .prom / .txt get Prometheus text, anything else JSON
+        with open(path, "w") as out:
+            out.write(self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_json())
+
+
+@contextmanager
+def profiled(kind=None, limit=40):
+    # Optional profiler around a run. kind is None (off), "cprofile" or
+    # "pyinstrument" (imported only when asked for). Yields a dict whose
+    # "report" holds the text report once the block exits.
+    result = {"report": None}
+    if kind is None:
+        yield result
+    elif kind == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield result
+        finally:
+            profiler.disable()
+            report = io.StringIO()
+            pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(limit)
+            result["report"] = report.getvalue()
+    elif kind == "pyinstrument":
+        from pyinstrument import Profiler
+
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+        try:
+            yield result
+        finally:
+            profiler.stop()
+            result["report"] = profiler.output_text()
+    else:
+        raise ValueError(f"Unknown profiler: {kind}")
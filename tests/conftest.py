@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root and the mock server imports its
+# helpers from benchmarks/, as when the scripts are run directly
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.join(root, "benchmarks"))
+
+from benchmarks.mock_socrata import MockSocrata  # noqa: E402
+
+
+@pytest.fixture
+def mock_socrata():
+    # A fresh server per test, without simulated latency
+    with MockSocrata(latency=0) as server:
+        yield server
@@ -0,0 +1,113 @@
+import asyncio
+
+import aiohttp
+from aiohttp import web
+
+import socrata_client
+from benchmarks.mock_socrata import MockSocrata
+from benchmarks.synthetic_reports import dataset_id
+from catalog_bulk import fetch_metadata_bulk
+from metadata_pipeline import MetadataFetcher
+from socrata_client import SocrataClient
+
+
+class BatchOmitsMockSocrata(MockSocrata):
+    # views.json leaves some IDs out, as the portal does for assets the batch
+    # endpoint cannot return, while the per-ID endpoint still serves them
+    def __init__(self, omitted, **kwargs):
+        super().__init__(**kwargs)
+        self.omitted = set(omitted)
+
+    async def views(self, request):
+        failure = await self.delay()
+        if failure is not None:
+            return failure
+        dataset_ids = [dataset_id for dataset_id in request.query.get("ids", "").split(",") if dataset_id]
+        return web.json_response([
+            self.view(dataset_id) for dataset_id in dataset_ids
+            if not self.missing(dataset_id) and dataset_id not in self.omitted
+        ])
+
+
+class BatchDownMockSocrata(MockSocrata):
+    # views.json always answers 503 while the per-ID endpoint works
+    async def views(self, request):
+        self.stats["errors"] += 1
+        return web.json_response({"error": "unavailable"}, status=503)
+
+
+def report_urls(server, numbers):
+    return [f"{server.base_url}/api/views/metadata/v1/{dataset_id(n)}" for n in numbers]
+
+
+def fetch_bulk(server, urls, chunk_size=10):
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            client = SocrataClient(session, "test-token")
+            return await fetch_metadata_bulk(client, urls, base_url=server.base_url, chunk_size=chunk_size)
+    return asyncio.run(run())
+
+
+def test_batch_resolves_every_id_with_one_request_per_chunk(mock_socrata):
+    urls = report_urls(mock_socrata, range(25))
+
+    found = fetch_bulk(mock_socrata, urls, chunk_size=10)
+
+    assert set(found) == set(urls)
+    assert all(found[url].id == url.rsplit("/", 1)[-1] for url in urls)
+    assert mock_socrata.stats["requests"] == 3
+
+
+def test_repeated_ids_are_requested_once(mock_socrata):
+    urls = report_urls(mock_socrata, [1, 2, 1, 2, 3])
+
+    found = fetch_bulk(mock_socrata, urls)
+
+    assert set(found) == set(urls)
+    assert mock_socrata.stats["requests"] == 1
+
+
+def test_partial_misses_are_left_out():
+    with MockSocrata(latency=0, missing_rate=0.3) as server:
+        urls = report_urls(server, range(40))
+        missing = {url for url in urls if server.missing(url.rsplit("/", 1)[-1])}
+
+        found = fetch_bulk(server, urls)
+
+    assert missing and len(missing) < len(urls)
+    assert set(found) == set(urls) - missing
+    assert server.stats["requests"] == 4
+
+
+def test_ids_the_batch_omits_fall_back_to_per_id_requests():
+    with BatchOmitsMockSocrata((), latency=0, missing_rate=0.2) as server:
+        ids = [dataset_id(n) for n in range(20)]
+        missing = {each for each in ids if server.missing(each)}
+        server.omitted = set([each for each in ids if each not in missing][:2])
+        fetcher = MetadataFetcher("test-token", use_bulk_lookup=True, bulk_chunk_size=10, base_url=server.base_url)
+
+        rows = fetcher.run([(url, "Error") for url in report_urls(server, range(20))])
+
+    by_id = {row["Unique ID"]: row for row in rows}
+    assert set(by_id) == set(ids)
+    for omitted_id in server.omitted:
+        assert "Fetch error" not in by_id[omitted_id]
+        assert by_id[omitted_id]["Dataset Name"] is not None
+    assert missing
+    for missing_id in missing:
+        assert "HTTP 404" in by_id[missing_id]["Fetch error"]
+    # Two batches, then one GET per ID the batches did not return
+    assert server.stats["requests"] == 2 + len(server.omitted) + len(missing)
+
+
+def test_a_failing_batch_endpoint_does_not_block_per_id_requests(monkeypatch):
+    monkeypatch.setattr(socrata_client, "backoff_base", 0)
+    with BatchDownMockSocrata(latency=0) as server:
+        fetcher = MetadataFetcher("test-token", use_bulk_lookup=True, bulk_chunk_size=10, base_url=server.base_url)
+
+        rows = fetcher.run([(url, "Error") for url in report_urls(server, range(50))])
+
+    assert len(rows) == 50
+    assert [row["Fetch error"] for row in rows if "Fetch error" in row] == []
+    # Enough batch failures to open the circuit of views.json, which the per-ID requests do not share
+    assert server.stats["errors"] >= socrata_client.breaker_threshold
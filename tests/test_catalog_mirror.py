@@ -0,0 +1,60 @@
+import catalog_mirror
+from benchmarks.mock_socrata import MockSocrata
+from benchmarks.synthetic_reports import dataset_id
+from catalog_mirror import CatalogMirror, sync_catalog
+from metadata_pipeline import MetadataFetcher
+
+
+class NoIdMockSocrata(MockSocrata):
+    # Lists some assets without an ID, as the Discovery API does for damaged entries
+    def __init__(self, no_id, **kwargs):
+        super().__init__(**kwargs)
+        self.no_id = set(no_id)
+
+    def catalog_entry(self, n):
+        entry = super().catalog_entry(n)
+        if n in self.no_id:
+            del entry["resource"]["id"]
+        return entry
+
+
+def sync(server, mirror, full=False):
+    fetcher = MetadataFetcher("test-token", base_url=server.base_url)
+    return sync_catalog(fetcher, mirror, "data.wa.gov", full)
+
+
+def test_pages_continue_past_results_without_an_id(tmp_path, monkeypatch):
+    monkeypatch.setattr(catalog_mirror, "catalog_page_size", 10)
+    mirror = CatalogMirror(str(tmp_path / "mirror.sqlite"))
+    try:
+        with NoIdMockSocrata({3, 4}, latency=0, catalog_size=25) as server:
+            counts = sync(server, mirror)
+            listed = mirror.listed_changes("data.wa.gov")
+    finally:
+        mirror.close()
+
+    # The first page had 8 usable entries out of 10, which is not the end of the catalog
+    assert counts["assets"] == 23
+    assert set(listed) == {dataset_id(n) for n in range(25)} - {dataset_id(3), dataset_id(4)}
+    assert not counts["complete"]
+
+
+def test_an_incomplete_listing_removes_nothing(tmp_path, monkeypatch):
+    monkeypatch.setattr(catalog_mirror, "catalog_page_size", 10)
+    mirror = CatalogMirror(str(tmp_path / "mirror.sqlite"))
+    try:
+        with MockSocrata(latency=0, catalog_size=25) as server:
+            assert sync(server, mirror)["complete"]
+        with NoIdMockSocrata({7}, latency=0, catalog_size=25) as server:
+            counts = sync(server, mirror)
+        assert counts["removed"] == 0
+        assert len(mirror.listed_changes("data.wa.gov")) == 25
+
+        # Listed in full, the assets that are gone are removed
+        with MockSocrata(latency=0, catalog_size=20) as server:
+            counts = sync(server, mirror)
+        assert counts["complete"]
+        assert counts["removed"] == 5
+        assert set(mirror.listed_changes("data.wa.gov")) == {dataset_id(n) for n in range(20)}
+    finally:
+        mirror.close()
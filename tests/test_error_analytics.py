@@ -0,0 +1,27 @@
+from error_analytics import ErrorAnalytics, unknown_age, update_age
+
+now = 1700000000  # 2023-11-14T22:13:20Z
+day = 86400
+
+
+def test_update_age_accepts_epoch_seconds_and_iso_strings():
+    assert update_age(now - 10 * day, now) == "Under 30 days"
+    assert update_age(str(now - 100 * day), now) == "30-180 days"
+    assert update_age("2023-01-01T00:00:00.000Z", now) == "180 days-1 year"
+    assert update_age("2021-03-04", now) == "Over 2 years"
+
+
+def test_unreadable_dates_are_unknown():
+    for value in (None, "", "not a date", float("nan")):
+        assert update_age(value, now) == unknown_age
+
+
+def test_rows_fall_back_to_the_upload_date():
+    analytics = ErrorAnalytics(now=now).add([
+        {"Unique ID": "aaaa-0001", "Last Update": "2023-11-01T00:00:00Z", "error": "Empty column"},
+        {"Unique ID": "aaaa-0002", "Last Update": "garbled", "Initial Upload Date": "2022-06-01",
+         "error": "Empty column"},
+        {"Unique ID": "aaaa-0003", "Last Update": None, "Initial Upload Date": None, "error": "Empty column"}
+    ])
+
+    assert analytics.values("Update Age") == ["Under 30 days", "1-2 years", unknown_age]
@@ -0,0 +1,29 @@
+import io
+import json
+
+import pandas as pd
+
+from exporters import chunk_rows, write_jsonl
+from metadata_pipeline import results_frame
+
+
+def test_jsonl_has_one_parsable_line_per_row_across_chunks():
+    df = results_frame([
+        {"Unique ID": f"{n >> 16:04x}-{n & 0xffff:04x}", "Dataset Name": f"Dataset {n}",
+         "Initial Upload Date": 1600000000 + n}
+        for n in range(chunk_rows * 2 + 5000)
+    ])
+    out = io.BytesIO()
+
+    write_jsonl(df, out)
+
+    lines = out.getvalue().decode("utf-8").split("\n")
+    assert lines[-1] == ""  # Ends with a newline
+    rows = [json.loads(line) for line in lines[:-1]]
+    assert [row["Unique ID"] for row in rows] == list(df["Unique ID"])
+
+
+def test_empty_jsonl_is_empty():
+    out = io.BytesIO()
+    write_jsonl(pd.DataFrame({"Unique ID": []}), out)
+    assert out.getvalue() == b""
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from fetch_pipeline import run_fan_out, run_pipeline
+
+
+class StopRun(Exception):
+    # Stands in for the exception Streamlit raises from st.* calls to stop or rerun a script
+    pass
+
+
+def records(count, groups=("a", "b")):
+    return [(groups[n % len(groups)], n) for n in range(count)]
+
+
+async def fetch_row(group, n):
+    await asyncio.sleep(0)
+    return {"group": group, "n": n}
+
+
+def fan_out(records, on_batch=None):
+    async def run_group(group, group_records):
+        return await run_pipeline(group_records, fetch_row, on_batch, workers=4, batch_size=10)
+
+    async def run():
+        return await asyncio.wait_for(run_fan_out(records, lambda record: record[0], run_group, queue_size=20), 10)
+    return asyncio.run(run())
+
+
+def test_every_record_is_fetched_by_its_group():
+    results = fan_out(records(500))
+
+    assert sorted(results) == ["a", "b"]
+    assert sorted(row["n"] for row in results["a"]) == list(range(0, 500, 2))
+    assert sorted(row["n"] for row in results["b"]) == list(range(1, 500, 2))
+
+
+def test_a_failing_group_stops_the_run():
+    batches = []
+
+    def on_batch(rows, done, parsed, parsing_done):
+        batches.append(len(rows))
+        if len(batches) >= 3:
+            raise StopRun()
+
+    with pytest.raises(StopRun):
+        fan_out(records(5000), on_batch)
+
+
+def test_a_failing_pipeline_stops_reading_records():
+    read = []
+
+    def numbered():
+        for n in range(5000):
+            read.append(n)
+            yield ("a", n)
+
+    def on_batch(rows, done, parsed, parsing_done):
+        raise StopRun()
+
+    async def run():
+        return await asyncio.wait_for(run_pipeline(numbered(), fetch_row, on_batch, workers=4, batch_size=10), 10)
+
+    with pytest.raises(StopRun):
+        asyncio.run(run())
+    assert len(read) < 5000
@@ -0,0 +1,49 @@
+from benchmarks.synthetic_reports import dataset_id
+from metadata_cache import MetadataCache
+from metadata_pipeline import MetadataFetcher
+
+
+def records(server, numbers):
+    return [(f"{server.base_url}/api/views/metadata/v1/{dataset_id(n)}", "Error") for n in numbers]
+
+
+def test_fresh_entries_are_served_from_the_cache(mock_socrata, tmp_path):
+    cache = MetadataCache(str(tmp_path / "cache.sqlite"))
+    fetcher = MetadataFetcher("test-token", cache=cache, use_bulk_lookup=False)
+    fetcher.run(records(mock_socrata, range(5)))
+    requests = mock_socrata.stats["requests"]
+
+    rows = fetcher.run(records(mock_socrata, range(5)))
+
+    assert mock_socrata.stats["requests"] == requests
+    assert cache.hits == 5
+    assert all("Fetch error" not in row for row in rows)
+
+
+def test_revalidate_checks_fresh_entries_with_the_portal(mock_socrata, tmp_path):
+    cache = MetadataCache(str(tmp_path / "cache.sqlite"))
+    fetcher = MetadataFetcher("test-token", cache=cache, use_bulk_lookup=False)
+    fetcher.run(records(mock_socrata, range(5)))
+    cache.reset_stats()
+
+    fetcher.revalidate = True
+    rows = fetcher.run(records(mock_socrata, range(5)))
+
+    assert cache.hits == 0
+    assert cache.revalidated == 5
+    assert mock_socrata.stats["not_modified"] == 5
+    assert all(row["Dataset Name"] is not None for row in rows)
+
+
+def test_revalidate_refetches_bulk_lookups(mock_socrata, tmp_path):
+    cache = MetadataCache(str(tmp_path / "cache.sqlite"))
+    fetcher = MetadataFetcher("test-token", cache=cache, base_url=mock_socrata.base_url)
+    fetcher.run(records(mock_socrata, range(5)))
+    requests = mock_socrata.stats["requests"]
+    cache.reset_stats()
+
+    fetcher.revalidate = True
+    fetcher.run(records(mock_socrata, range(5)))
+
+    assert cache.hits == 0
+    assert mock_socrata.stats["requests"] == requests + 1
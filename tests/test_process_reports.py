@@ -0,0 +1,53 @@
+from benchmarks.synthetic_reports import dataset_id
+from catalog_mirror import CatalogMirror
+from metadata_cache import MetadataCache
+from metadata_pipeline import MetadataFetcher, process_reports
+from report_index import ReportSource
+from run_history import RunHistory
+
+
+def report(server, numbers):
+    return "".join(
+        f"Asset Identifier: {server.base_url}/api/views/metadata/v1/{dataset_id(n)}; Title: T; Found. Error {n}\n"
+        for n in numbers
+    ).encode()
+
+
+def test_history_runs_fetch_only_what_changed(mock_socrata, tmp_path):
+    history = RunHistory(str(tmp_path / "history.sqlite"))
+    cache = MetadataCache(str(tmp_path / "cache.sqlite"))
+    fetcher = MetadataFetcher("test-token", cache, base_url=mock_socrata.base_url)
+    sources = [ReportSource("report.txt", report(mock_socrata, [1, 2, 3, 2]), None)]
+    try:
+        first = process_reports(fetcher, sources, history)
+        second = process_reports(fetcher, sources, history)
+        refreshed = process_reports(fetcher, sources, history, full_refresh=True)
+    finally:
+        history.close()
+        cache.close()
+
+    assert len(first.rows) == 3
+    assert first.parse_stats["duplicates"] == 1
+    assert first.delta.counts["fetched"] == 3
+    assert first.cache_stats == (0, 0, 3)
+    assert first.analytics.count() == 3
+    assert second.delta.counts["fetched"] == 0
+    assert {row["Change"] for row in second.rows} == {"unchanged"}
+    # A full refresh fetches everything again, without answering from the fresh cache entries
+    assert refreshed.delta.counts["fetched"] == 3
+    assert refreshed.cache_stats == (0, 0, 3)
+
+
+def test_offline_runs_answer_from_the_mirror_only(mock_socrata, tmp_path):
+    mirror = CatalogMirror(str(tmp_path / "mirror.sqlite"))
+    fetcher = MetadataFetcher("test-token", base_url=mock_socrata.base_url)
+    sources = [ReportSource("report.txt", report(mock_socrata, [1, 2]), None)]
+    try:
+        run = process_reports(fetcher, sources, source="offline", mirror=mirror, analytics=False)
+    finally:
+        mirror.close()
+
+    assert run.delta is None and run.analytics is None
+    assert all("Fetch error" in row for row in run.rows)
+    assert mock_socrata.stats["requests"] == 0
+    assert fetcher.mirror is mirror and fetcher.offline
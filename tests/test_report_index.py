@@ -0,0 +1,114 @@
+import io
+
+import report_index
+from report_index import ReportIndex, ReportSource
+from run_history import DeltaRun, RunHistory, change_changed, change_new, change_unchanged
+
+
+class CountingStream(io.BytesIO):
+    # Remembers how many bytes have been read so far
+    def __init__(self, content):
+        super().__init__(content)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+
+def report(*lines):
+    return "".join(
+        f"Asset Identifier: https://data.wa.gov/d/{dataset_id}; Title: Title {dataset_id}; Found. {error}\n"
+        for dataset_id, error in lines
+    ).encode()
+
+
+def fetched_row(url, error):
+    dataset_id = url.rsplit("/", 1)[-1]
+    return {"Unique ID": dataset_id, "Domain": "data.wa.gov", "Dataset Name": f"Name {dataset_id}", "error": error}
+
+
+def test_datasets_stream_out_before_the_report_is_read():
+    content = report(*[(f"aaaa-{n:04d}", "Empty column") for n in range(20000)])
+    stream = CountingStream(content)
+    index = ReportIndex()
+
+    records = index.stream([ReportSource("report.txt", stream, "data.wa.gov")])
+    url, error = next(records)
+
+    assert url == "https://data.wa.gov/d/aaaa-0000"
+    assert error == "Empty column"
+    assert stream.bytes_read < len(content)
+
+
+def test_repeated_datasets_stream_once_and_merge_their_errors():
+    index = ReportIndex()
+    sources = [
+        ReportSource("first.txt", report(("aaaa-0001", "Empty column"), ("aaaa-0002", "No owner")), "data.wa.gov"),
+        ReportSource("second.txt", report(("aaaa-0001", "No owner"), ("aaaa-0001", "Empty column")), "data.wa.gov")
+    ]
+
+    records = list(index.stream(sources))
+    rows = index.merge([fetched_row(url, error) for url, error in records])
+
+    assert [error for url, error in records] == ["Empty column", "No owner"]
+    assert rows[0]["error"] == "Empty column | No owner"
+    assert rows[0]["Error Count"] == 3
+    assert rows[0]["Error Lines"] == "first.txt:1, second.txt:1, second.txt:2"
+    assert rows[1]["Error Count"] == 1
+    assert index.stats["records"] == 4
+    assert index.stats["duplicates"] == 2
+
+
+def test_large_uploads_are_parsed_in_parallel_while_the_first_streams(monkeypatch):
+    monkeypatch.setattr(report_index, "parallel_min_bytes", 0)
+    contents = [report(*[(f"{n:04d}-{m:04d}", f"Error {m % 3}") for m in range(20000 if n == 0 else 3000)])
+                for n in range(3)]
+    contents.append(report(("0000-0001", "Again")))
+    streams = [CountingStream(content) for content in contents]
+    parallel = ReportIndex()
+
+    records = parallel.stream([ReportSource(f"r{n}.txt", stream, "data.wa.gov") for n, stream in enumerate(streams)],
+                              workers=2)
+    first = next(records)
+    assert streams[0].bytes_read < len(contents[0])
+    urls = [first] + list(records)
+
+    sequential = ReportIndex()
+    expected = list(sequential.stream(
+        [ReportSource(f"r{n}.txt", content, "data.wa.gov") for n, content in enumerate(contents)], workers=1
+    ))
+    assert urls == expected
+    assert parallel.lines == sequential.lines
+    assert parallel.stats == sequential.stats
+
+
+def run(history, *reports):
+    index = ReportIndex()
+    sources = [ReportSource(f"report{n}.txt", content, "data.wa.gov") for n, content in enumerate(reports)]
+    delta = DeltaRun(history)
+    fetched = [fetched_row(url, error) for url, error in delta.filter(index.stream(sources))]
+    rows = delta.finish(fetched, index.merge)
+    return {row["Unique ID"]: row for row in rows}, delta
+
+
+def test_delta_run_compares_merged_errors(tmp_path):
+    history = RunHistory(str(tmp_path / "history.sqlite"))
+    try:
+        first, delta = run(history, report(("aaaa-0001", "Empty column"), ("aaaa-0002", "No owner")),
+                           report(("aaaa-0001", "No owner")))
+        assert {row["Change"] for row in first.values()} == {change_new}
+        assert first["aaaa-0001"]["error"] == "Empty column | No owner"
+
+        second, delta = run(history, report(("aaaa-0001", "Empty column"), ("aaaa-0002", "Stale")),
+                            report(("aaaa-0001", "No owner")))
+    finally:
+        history.close()
+
+    # Same first error: reused without a fetch, and unchanged once merged
+    assert second["aaaa-0001"]["Change"] == change_unchanged
+    assert second["aaaa-0001"]["error"] == "Empty column | No owner"
+    assert second["aaaa-0001"]["Runs Seen"] == 2
+    assert second["aaaa-0002"]["Change"] == change_changed
+    assert delta.counts["fetched"] == 1
@@ -0,0 +1,21 @@
+import pandas as pd
+
+from metadata_pipeline import results_frame
+
+
+def test_dates_accept_epoch_seconds_and_iso_strings():
+    df = results_frame([
+        {"Unique ID": "aaaa-0001", "Initial Upload Date": 1600000000, "Last Update": "1600000060"},
+        {"Unique ID": "aaaa-0002", "Initial Upload Date": "2021-03-04T05:06:07.000Z", "Last Update": None},
+        {"Unique ID": "aaaa-0003", "Initial Upload Date": "2020-01-01", "Last Update": "not a date"}
+    ])
+
+    assert list(df["Initial Upload Date"]) == [
+        pd.Timestamp("2020-09-13 12:26:40", tz="UTC"),
+        pd.Timestamp("2021-03-04 05:06:07", tz="UTC"),
+        pd.Timestamp("2020-01-01", tz="UTC")
+    ]
+    assert df["Last Update"][0] == pd.Timestamp("2020-09-13 12:27:40", tz="UTC")
+    # A missing or unreadable last update falls back to the upload date
+    assert df["Last Update"][1] == df["Initial Upload Date"][1]
+    assert df["Last Update"][2] == df["Initial Upload Date"][2]
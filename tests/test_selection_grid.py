@@ -0,0 +1,51 @@
+from streamlit.testing.v1 import AppTest
+
+
+def grid_app():
+    import pandas as pd
+    import streamlit as st
+
+    from selection_grid import selection_grid
+
+    def data_editor(grid, key, **kwargs):
+        # Stands in for st.data_editor: edits are kept under the widget key and
+        # replayed onto the rendered grid on every rerun, as Streamlit does
+        edits = st.session_state.setdefault(key, {})
+        edits.update(st.session_state.pop("ticks", {}))
+        edited = grid.copy()
+        for position, value in edits.items():
+            edited.iloc[position, 0] = value
+        return edited
+
+    st.data_editor = data_editor
+    df = pd.DataFrame({"Dataset Name": [f"Dataset {n}" for n in range(250)]})
+    st.session_state["result"] = list(selection_grid(df, "test").index)
+
+
+def tick(at, *positions, value=True):
+    at.session_state["ticks"] = {position: value for position in positions}
+    return at.run()
+
+
+def test_clearing_forgets_ticks_on_every_page():
+    at = AppTest.from_function(grid_app).run()
+    tick(at, 0, 1)
+    at.number_input(key="test_page").set_value(2).run()
+    tick(at, 0)
+    assert at.session_state["result"] == [0, 1, 100]
+
+    at.button(key="test_clear").click().run()
+    assert at.session_state["result"] == []
+    at.number_input(key="test_page").set_value(1).run()
+    assert at.session_state["result"] == []
+
+
+def test_unticking_elsewhere_is_not_undone_by_an_earlier_view():
+    at = AppTest.from_function(grid_app).run()
+    tick(at, 5)
+    at.text_input(key="test_filter").input("Dataset 5").run()
+    assert at.session_state["result"] == [5]
+
+    tick(at, 0, value=False)  # "Dataset 5" is the first match
+    at.text_input(key="test_filter").input("").run()
+    assert at.session_state["result"] == []
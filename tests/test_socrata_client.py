@@ -0,0 +1,68 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+import socrata_client
+from socrata_client import CircuitBreaker, FetchError, SocrataClient
+
+
+def test_open_circuit_lets_one_trial_through_after_cooldown(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(socrata_client.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(threshold=2, cooldown=10)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    now[0] = 10.0
+    assert breaker.allow()
+    assert not breaker.allow()  # Concurrent requests wait for the trial
+
+    breaker.record_success()
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_trial_reopens_the_circuit(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(socrata_client.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(threshold=1, cooldown=10)
+    breaker.record_failure()
+
+    now[0] = 10.0
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    now[0] = 20.0
+    assert breaker.allow()
+
+
+def test_lost_trial_is_replaced_after_another_cooldown(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(socrata_client.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(threshold=1, cooldown=10)
+    breaker.record_failure()
+
+    now[0] = 10.0
+    assert breaker.allow()
+    now[0] = 15.0
+    assert not breaker.allow()
+    now[0] = 20.0
+    assert breaker.allow()
+
+
+def test_retries_exhausted_raise_fetch_error_with_status(mock_socrata, monkeypatch):
+    monkeypatch.setattr(socrata_client, "backoff_base", 0)
+    mock_socrata.error_rate = 1.0
+
+    url = f"{mock_socrata.base_url}/api/views/metadata/v1/0000-0001"
+
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            return await SocrataClient(session, "test-token").get(url)
+
+    with pytest.raises(FetchError) as raised:
+        asyncio.run(run())
+    assert raised.value.status == 500
+    assert mock_socrata.stats["requests"] == socrata_client.max_retries + 1
@@ -0,0 +1,105 @@
+import pytest
+
+import socrata_client
+from benchmarks.mock_socrata import MockSocrata
+from benchmarks.synthetic_reports import dataset_id
+from update_backends import ApiUpdateBackend, FallbackUpdateBackend, UpdateError
+
+
+class RecordingBackend:
+    # Stands in for the Selenium backend and remembers what it was handed
+    def __init__(self):
+        self.received = []
+        self.closed = False
+
+    def update_many(self, dataset_ids, new_description):
+        self.received.extend(dataset_ids)
+        return [(dataset_id, None) for dataset_id in dataset_ids]
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(socrata_client, "backoff_base", 0)
+
+
+def test_patches_every_dataset_over_one_session(mock_socrata):
+    backend = ApiUpdateBackend(mock_socrata.base_url, "user@example.com", "secret", "test-token")
+    ids = [dataset_id(n) for n in range(15)]
+    try:
+        first = backend.update_many(ids[:10], "New description")
+        session = backend.session
+        second = backend.update_many(ids[10:], "New description")
+        assert backend.session is session
+    finally:
+        backend.close()
+
+    assert first + second == [(each, None) for each in ids]
+    assert mock_socrata.stats["requests"] == 15
+
+
+def test_throttled_patches_are_retried():
+    with MockSocrata(latency=0, throttle_rate=0.3, retry_after=0) as server:
+        backend = ApiUpdateBackend(server.base_url, "user@example.com", "secret", "test-token")
+        try:
+            outcomes = backend.update_many([dataset_id(n) for n in range(20)], "New description")
+        finally:
+            backend.close()
+
+    assert server.stats["throttled"] > 0
+    assert all(exception is None for each, exception in outcomes)
+    assert backend.client.stats["throttled"] == server.stats["throttled"]
+
+
+def test_missing_datasets_fail_with_their_status():
+    with MockSocrata(latency=0, missing_rate=0.3) as server:
+        ids = [dataset_id(n) for n in range(20)]
+        missing = {each for each in ids if server.missing(each)}
+        backend = ApiUpdateBackend(server.base_url, "user@example.com", "secret", "test-token")
+        try:
+            outcomes = dict(backend.update_many(ids, "New description"))
+        finally:
+            backend.close()
+
+    assert missing
+    for each in ids:
+        if each in missing:
+            assert isinstance(outcomes[each], UpdateError)
+            assert outcomes[each].status == 404
+        else:
+            assert outcomes[each] is None
+
+
+def test_fallback_skips_failures_the_browser_cannot_fix():
+    with MockSocrata(latency=0, missing_rate=0.3) as server:
+        ids = [dataset_id(n) for n in range(20)]
+        fallback = RecordingBackend()
+        backend = FallbackUpdateBackend(
+            ApiUpdateBackend(server.base_url, "user@example.com", "secret", "test-token"), fallback
+        )
+        try:
+            outcomes = dict(backend.update_many(ids, "New description"))
+        finally:
+            backend.close()
+
+    assert fallback.received == []
+    assert fallback.closed
+    assert sum(1 for exception in outcomes.values() if exception is not None) > 0
+
+
+def test_fallback_takes_over_when_the_api_keeps_failing():
+    with MockSocrata(latency=0, error_rate=1.0) as server:
+        ids = [dataset_id(n) for n in range(3)]
+        fallback = RecordingBackend()
+        backend = FallbackUpdateBackend(
+            ApiUpdateBackend(server.base_url, "user@example.com", "secret", "test-token"), fallback
+        )
+        try:
+            outcomes = backend.update_many(ids, "New description")
+        finally:
+            backend.close()
+
+    assert sorted(fallback.received) == ids
+    assert outcomes == [(each, None) for each in ids]
@@ -0,0 +1,93 @@
+import os
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import update_jobs
+from update_jobs import JobQueue, ensure_worker
+
+
+@pytest.fixture
+def jobs_path(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    queue = JobQueue(path)
+    queue.submit("https://data.wa.gov", ["aaaa-0001", "aaaa-0002"], "New description")
+    queue.close()
+    return path
+
+
+@pytest.fixture
+def started(monkeypatch):
+    # Records worker starts instead of spawning processes; each "worker" gets this process's ID
+    started = []
+
+    def start_worker(path, email, password, app_token=None):
+        started.append(path)
+        return SimpleNamespace(pid=os.getpid())
+
+    monkeypatch.setattr(update_jobs, "start_worker", start_worker)
+    return started
+
+
+def test_concurrent_callers_start_one_worker(jobs_path, started):
+    queues = [JobQueue(jobs_path) for _ in range(8)]
+    barrier = threading.Barrier(len(queues))
+
+    def call(queue):
+        barrier.wait()
+        ensure_worker(queue, "user@example.com", "secret")
+
+    threads = [threading.Thread(target=call, args=(queue,)) for queue in queues]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for queue in queues:
+        queue.close()
+
+    assert started == [jobs_path]
+
+
+def test_a_worker_counts_as_alive_while_it_starts(jobs_path, started):
+    queue = JobQueue(jobs_path)
+    try:
+        marker = queue.reserve_worker()
+        assert marker is not None
+        assert queue.worker_alive()
+        assert not ensure_worker(queue, "user@example.com", "secret")
+
+        queue.worker_started(marker, os.getpid())
+        assert queue.worker_alive()
+        assert not ensure_worker(queue, "user@example.com", "secret")
+    finally:
+        queue.close()
+
+    assert started == []
+
+
+def test_a_start_that_never_reported_back_expires(jobs_path, started, monkeypatch):
+    queue = JobQueue(jobs_path)
+    try:
+        assert queue.reserve_worker() is not None
+        monkeypatch.setattr(update_jobs, "start_grace", -1)
+        assert not queue.worker_alive()
+        assert ensure_worker(queue, "user@example.com", "secret")
+    finally:
+        queue.close()
+
+    assert started == [jobs_path]
+
+
+def test_a_failed_start_leaves_no_marker(jobs_path, monkeypatch):
+    def start_worker(path, email, password, app_token=None):
+        raise OSError("no python")
+
+    monkeypatch.setattr(update_jobs, "start_worker", start_worker)
+    queue = JobQueue(jobs_path)
+    try:
+        with pytest.raises(OSError):
+            ensure_worker(queue, "user@example.com", "secret")
+        assert not queue.worker_alive()
+    finally:
+        queue.close()
@@ -0,0 +1,123 @@
+import asyncio
+import base64
+
+from socrata_client import FetchError, SocrataClient, open_session, retry_statuses
+
+# Pluggable backends for bulk description updates.
+# Every backend exposes update_many(dataset_ids, new_description) and returns
+# [(dataset_id, exception_or_None)] in input order, plus close(), so the apps
+# can switch between the REST API and browser automation without other changes.
+
+default_concurrency = 10  # PATCH requests in flight at once
+
+
+class UpdateError(Exception):
+    def __init__(self, dataset_id, status, message):
+        super().__init__(f"{dataset_id}: {message}")
+        self.dataset_id = dataset_id
+        self.status = status  # HTTP status, or None when no response came back
+
+
+def browser_can_fix(exception):
+    # API failures the Selenium UI may still get past: the portal was unreachable,
+    # throttled or failing, or the API refused the method. A 403 or 404 fails in
+    # the browser as well, so those are not worth starting Chrome for.
+    status = getattr(exception, "status", None)
+    return status is None or status in retry_statuses or status == 405
+
+
+class ApiUpdateBackend:
+    # PATCHes /api/views/metadata/v1/<id> through a SocrataClient, so updates get
+    # the same token bucket, Retry-After handling, backoff and circuit breaker as
+    # the metadata fetches. One event loop, session and client are kept for the
+    # backend's lifetime and shared by every update_many call; close() ends them.
+    # base_url can point at a local mock server.
+    def __init__(self, base_url, email, password, app_token=None, concurrency=default_concurrency):
+        self.base_url = base_url.rstrip("/")
+        credentials = base64.b64encode(f"{email or ''}:{password or ''}".encode()).decode()
+        self.authorization = f"Basic {credentials}"
+        self.app_token = app_token
+        self.concurrency = concurrency
+        self.loop = None
+        self.session = None
+        self.client = None
+
+    async def connect(self):
+        self.session = open_session(self.concurrency)
+        self.client = SocrataClient(self.session, self.app_token)
+        self.client.headers["Authorization"] = self.authorization
+
+    async def patch_description(self, semaphore, dataset_id, new_description):
+        url = f"{self.base_url}/api/views/metadata/v1/{dataset_id}"
+        async with semaphore:
+            try:
+                await self.client.request("PATCH", url, json={"description": new_description})
+            except FetchError as e:
+                raise UpdateError(dataset_id, e.status, str(e)) from e
+
+    async def update_many_async(self, dataset_ids, new_description):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        outcomes = await asyncio.gather(
+            *(self.patch_description(semaphore, dataset_id, new_description) for dataset_id in dataset_ids),
+            return_exceptions=True
+        )
+        return [
+            (dataset_id, outcome if isinstance(outcome, Exception) else None)
+            for dataset_id, outcome in zip(dataset_ids, outcomes)
+        ]
+
+    def update_many(self, dataset_ids, new_description):
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+            self.loop.run_until_complete(self.connect())
+        return self.loop.run_until_complete(self.update_many_async(list(dataset_ids), new_description))
+
+    def close(self):
+        if self.loop is not None:
+            self.loop.run_until_complete(self.session.close())
+            self.loop.close()
+            self.loop = None
+
+
+class SeleniumUpdateBackend:
+    # Drives the portal UI through a DriverPool; update_description is the
+    # per-dataset edit function (driver, base_url, dataset_id, new_description).
+    # pool may also be a function returning the pool, so the Selenium stack is
+    # only imported once this backend actually has work.
+    def __init__(self, pool, base_url, update_description):
+        self.pool = pool
+        self.base_url = base_url
+        self.update_description = update_description
+
+    def update_many(self, dataset_ids, new_description):
+        pool = self.pool() if callable(self.pool) else self.pool
+        return pool.map(
+            lambda driver, dataset_id: self.update_description(driver, self.base_url, dataset_id, new_description),
+            list(dataset_ids)
+        )
+
+    def close(self):
+        pass  # The pool belongs to whoever passed it in
+
+
+class FallbackUpdateBackend:
+    # Tries primary first and hands the failures should_fall_back accepts to fallback
+    def __init__(self, primary, fallback, should_fall_back=browser_can_fix):
+        self.primary = primary
+        self.fallback = fallback
+        self.should_fall_back = should_fall_back
+
+    def update_many(self, dataset_ids, new_description):
+        dataset_ids = list(dataset_ids)
+        outcomes = dict(self.primary.update_many(dataset_ids, new_description))
+        failed = [
+            dataset_id for dataset_id, exception in outcomes.items()
+            if exception is not None and self.should_fall_back(exception)
+        ]
+        if failed:
+            outcomes.update(self.fallback.update_many(failed, new_description))
+        return [(dataset_id, outcomes[dataset_id]) for dataset_id in dataset_ids]
+
+    def close(self):
+        self.primary.close()
+        self.fallback.close()
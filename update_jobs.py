@@ -0,0 +1,469 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+
+from step_runner import SessionExpired, step_stats
+from update_backends import ApiUpdateBackend, FallbackUpdateBackend, SeleniumUpdateBackend, default_concurrency
+
+# Background runner for bulk description updates.
+# The apps queue a job (portal, dataset IDs, new description) in a local
+# SQLite file and return straight away; a separate worker process claims
+# queued jobs and updates them in batches, checkpointing every dataset's
+# outcome after each batch. Closing the tab or restarting the app loses
+# nothing: a job whose worker stopped sending heartbeats is claimed again
+# and carries on with the datasets still pending. The apps poll progress
+# from the same file.
+#
+#   python error_pull_cli.py worker      # Works through the queue, exits when idle
+#   python error_pull_cli.py jobs        # Lists recent jobs
+
+default_jobs_path = "update_jobs.sqlite"
+checkpoint_size = 20  # Datasets per batch; outcomes are saved after every batch
+heartbeat_stale = 120  # Seconds without a heartbeat before a worker or running job counts as gone
+start_grace = 30  # Seconds a worker being started counts as alive before it has a process ID
+idle_exit = 60  # Seconds a worker waits for new jobs before it exits
+poll_interval = 1  # Seconds between queue checks while idle
+default_browsers = 4  # Logged-in browsers per portal for the Selenium backend
+
+# Job statuses
+job_queued = "queued"
+job_running = "running"
+job_done = "done"
+job_cancelled = "cancelled"
+
+# Per-dataset statuses
+item_pending = "pending"
+item_done = "done"
+item_failed = "failed"
+
+
+def process_exists(pid):
+    # Workers run on this machine, so a dead worker is noticed without waiting for its heartbeat
+    # to go stale. Windows has no signal 0 (os.kill would terminate the process), so it relies
+    # on heartbeats alone.
+    if pid is None or os.name == "nt":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobQueue:
+    def __init__(self, path=default_jobs_path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at REAL NOT NULL,
+                base_url TEXT NOT NULL,
+                description TEXT NOT NULL,
+                backend TEXT NOT NULL,
+                concurrency INTEGER NOT NULL,
+                browsers INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                worker_pid INTEGER,
+                started_at REAL,
+                heartbeat REAL,
+                finished_at REAL,
+                step_timings TEXT
+            )
+            """
+        )
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS items (
+                job_id INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                dataset_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL,
+                PRIMARY KEY (job_id, dataset_id)
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS items_status ON items (job_id, status, position)")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS workers (
+                pid INTEGER PRIMARY KEY,
+                started_at REAL NOT NULL,
+                heartbeat REAL NOT NULL
+            )
+            """
+        )
+        self.conn.commit()
+
+    def submit(self, base_url, dataset_ids, description, backend="api", concurrency=default_concurrency,
+               browsers=default_browsers):
+        # Queues one job and returns its ID; repeated IDs are updated once
+        dataset_ids = list(dict.fromkeys(dataset_ids))
+        with self.lock:
+            cursor = self.conn.execute(
+                """
+                INSERT INTO jobs (created_at, base_url, description, backend, concurrency, browsers, status)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (time.time(), base_url, description, backend, concurrency, browsers, job_queued)
+            )
+            job_id = cursor.lastrowid
+            self.conn.executemany(
+                "INSERT INTO items (job_id, position, dataset_id, status) VALUES (?, ?, ?, ?)",
+                [(job_id, position, dataset_id, item_pending) for position, dataset_id in enumerate(dataset_ids)]
+            )
+            self.conn.commit()
+        return job_id
+
+    def claim(self, worker_pid):
+        # Oldest queued job, or a running one whose worker went quiet; None if there is nothing to do
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            candidates = self.conn.execute(
+                "SELECT job_id, status, heartbeat, worker_pid FROM jobs WHERE status IN (?, ?) ORDER BY job_id",
+                (job_queued, job_running)
+            ).fetchall()
+            row = next(
+                (
+                    (job_id,) for job_id, status, heartbeat, pid in candidates
+                    if status == job_queued or heartbeat < now - heartbeat_stale or not process_exists(pid)
+                ),
+                None
+            )
+            if row is not None:
+                self.conn.execute(
+                    """
+                    UPDATE jobs SET status = ?, worker_pid = ?, started_at = COALESCE(started_at, ?), heartbeat = ?
+                    WHERE job_id = ?
+                    """,
+                    (job_running, worker_pid, now, now, row[0])
+                )
+            self.conn.commit()
+        return None if row is None else self.job(row[0])
+
+    def job(self, job_id):
+        with self.lock:
+            self.conn.row_factory = sqlite3.Row
+            try:
+                row = self.conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            finally:
+                self.conn.row_factory = None
+        return dict(row) if row is not None else None
+
+    def pending(self, job_id, limit):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT dataset_id FROM items WHERE job_id = ? AND status = ? ORDER BY position LIMIT ?",
+                (job_id, item_pending, limit)
+            ).fetchall()
+        return [dataset_id for dataset_id, in rows]
+
+    def checkpoint(self, job_id, outcomes, step_timings=None):
+        # outcomes: [(dataset_id, exception_or_None)] from an update backend
+        now = time.time()
+        with self.lock:
+            self.conn.executemany(
+                """
+                UPDATE items SET status = ?, error = ?, attempts = attempts + 1, updated_at = ?
+                WHERE job_id = ? AND dataset_id = ?
+                """,
+                [
+                    (item_done if exception is None else item_failed, None if exception is None else str(exception),
+                     now, job_id, dataset_id)
+                    for dataset_id, exception in outcomes
+                ]
+            )
+            self.conn.execute(
+                "UPDATE jobs SET heartbeat = ?, step_timings = COALESCE(?, step_timings) WHERE job_id = ?",
+                (now, json.dumps(step_timings) if step_timings else None, job_id)
+            )
+            self.conn.commit()
+
+    def touch(self, job_id):
+        with self.lock:
+            self.conn.execute("UPDATE jobs SET heartbeat = ? WHERE job_id = ?", (time.time(), job_id))
+            self.conn.commit()
+
+    def finish(self, job_id):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE job_id = ? AND status = ?",
+                (job_done, time.time(), job_id, job_running)
+            )
+            self.conn.commit()
+
+    def cancel(self, job_id):
+        # The worker stops after its current batch; datasets already updated stay updated
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE job_id = ? AND status IN (?, ?)",
+                (job_cancelled, time.time(), job_id, job_queued, job_running)
+            )
+            self.conn.commit()
+
+    def retry_failed(self, job_id):
+        # Puts a finished job's failed datasets back in the queue
+        with self.lock:
+            retried = self.conn.execute(
+                "UPDATE items SET status = ? WHERE job_id = ? AND status = ?", (item_pending, job_id, item_failed)
+            ).rowcount
+            if retried:
+                self.conn.execute(
+                    "UPDATE jobs SET status = ?, finished_at = NULL WHERE job_id = ? AND status IN (?, ?)",
+                    (job_queued, job_id, job_done, job_cancelled)
+                )
+            self.conn.commit()
+        return retried
+
+    def progress(self, job_id):
+        # {"pending": n, "done": n, "failed": n, "total": n}
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT status, COUNT(*) FROM items WHERE job_id = ? GROUP BY status", (job_id,)
+            ).fetchall()
+        counts = {item_pending: 0, item_done: 0, item_failed: 0}
+        counts.update(rows)
+        counts["total"] = sum(counts.values())
+        return counts
+
+    def failures(self, job_id):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT dataset_id, error FROM items WHERE job_id = ? AND status = ? ORDER BY position",
+                (job_id, item_failed)
+            ).fetchall()
+
+    def recent(self, limit=10):
+        # Newest jobs first, one dict per job with its progress, for st.dataframe
+        with self.lock:
+            rows = self.conn.execute(
+                """
+                SELECT job_id, created_at, base_url, backend, status, finished_at FROM jobs
+                ORDER BY job_id DESC LIMIT ?
+                """,
+                (limit,)
+            ).fetchall()
+        jobs = []
+        for job_id, created_at, base_url, backend, status, finished_at in rows:
+            counts = self.progress(job_id)
+            jobs.append({
+                "Job": job_id,
+                "Created": created_at,
+                "Portal": base_url,
+                "Backend": backend,
+                "Status": status,
+                "Done": counts[item_done],
+                "Failed": counts[item_failed],
+                "Pending": counts[item_pending],
+                "Total": counts["total"],
+                "Finished": finished_at
+            })
+        return jobs
+
+    def unfinished(self):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (job_queued, job_running)
+            ).fetchone()[0]
+
+    def beat(self, worker_pid):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                """
+                INSERT INTO workers VALUES (?, ?, ?)
+                ON CONFLICT (pid) DO UPDATE SET heartbeat = excluded.heartbeat
+                """,
+                (worker_pid, now, now)
+            )
+            self.conn.commit()
+
+    def retire(self, worker_pid):
+        with self.lock:
+            self.conn.execute("DELETE FROM workers WHERE pid = ?", (worker_pid,))
+            self.conn.commit()
+
+    def live_workers(self, now):
+        # Worker rows that count as alive. A negative pid marks a worker being
+        # started, whose process ID is not known yet.
+        rows = self.conn.execute(
+            "SELECT pid, heartbeat FROM workers WHERE heartbeat >= ?", (now - heartbeat_stale,)
+        ).fetchall()
+        return [
+            pid for pid, heartbeat in rows
+            if (heartbeat >= now - start_grace if pid < 0 else process_exists(pid))
+        ]
+
+    def worker_alive(self):
+        with self.lock:
+            return bool(self.live_workers(time.time()))
+
+    def reserve_worker(self):
+        # Records that a worker is being started, unless one is alive (or being
+        # started) already; returns the start marker, or None. Checked and written
+        # in one transaction, so concurrent callers start one worker between them.
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.execute("DELETE FROM workers WHERE pid < 0 AND heartbeat < ?", (now - start_grace,))
+            if self.live_workers(now):
+                self.conn.commit()
+                return None
+            marker = min(self.conn.execute("SELECT MIN(pid) FROM workers").fetchone()[0] or 0, 0) - 1
+            self.conn.execute("INSERT INTO workers VALUES (?, ?, ?)", (marker, now, now))
+            self.conn.commit()
+        return marker
+
+    def worker_started(self, marker, worker_pid):
+        # Swaps a start marker for the worker's process ID; the worker may have sent its first heartbeat already
+        now = time.time()
+        with self.lock:
+            self.conn.execute("DELETE FROM workers WHERE pid = ?", (marker,))
+            self.conn.execute("INSERT OR IGNORE INTO workers VALUES (?, ?, ?)", (worker_pid, now, now))
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def update_description(driver, base_url, dataset_id, new_description):
+    # Selenium edit of one dataset, run on a logged-in driver from the pool
+    # (in a worker thread, so it reports failures by raising)
+    from selenium_steps import run_steps, update_description_steps
+
+    try:
+        run_steps(driver, update_description_steps(base_url, dataset_id, new_description))
+
+    except SessionExpired:
+        raise
+
+    except Exception:
+        # Save a screenshot for debugging, then let the pool report the failure
+        driver.save_screenshot(f"screenshots/error_{dataset_id}.png")
+        raise
+
+
+class Worker:
+    # Claims jobs from the queue and runs them to completion, one at a time.
+    # Browsers are started on first use and kept per portal until the worker exits.
+    def __init__(self, queue, email, password, app_token=None):
+        self.queue = queue
+        self.email = email
+        self.password = password
+        self.app_token = app_token
+        self.pid = os.getpid()
+        self.pools = {}
+        self.current_job = None
+        self.stopped = threading.Event()
+
+    def driver_pool(self, base_url, size):
+        if base_url not in self.pools:
+            from selenium_pool import DriverPool
+
+            self.pools[base_url] = DriverPool(base_url, self.email, self.password, size=size)
+        return self.pools[base_url]
+
+    def backend(self, job):
+        # "api" PATCHes via the REST API with the Selenium UI as fallback; "selenium" drives the UI only
+        base_url = job["base_url"]
+        selenium_backend = SeleniumUpdateBackend(
+            lambda: self.driver_pool(base_url, job["browsers"]), base_url, update_description
+        )
+        if job["backend"] == "selenium":
+            return selenium_backend
+        api_backend = ApiUpdateBackend(base_url, self.email, self.password, self.app_token, job["concurrency"])
+        return FallbackUpdateBackend(api_backend, selenium_backend)
+
+    def keep_alive(self):
+        # Heartbeats from a side thread, so a slow batch is not mistaken for a dead worker
+        while not self.stopped.wait(heartbeat_stale / 4):
+            self.queue.beat(self.pid)
+            if self.current_job is not None:
+                self.queue.touch(self.current_job)
+
+    def run_job(self, job):
+        backend = self.backend(job)
+        batch_size = max(checkpoint_size, job["concurrency"])
+        try:
+            while self.queue.job(job["job_id"])["status"] == job_running:
+                dataset_ids = self.queue.pending(job["job_id"], batch_size)
+                if not dataset_ids:
+                    self.queue.finish(job["job_id"])
+                    break
+                outcomes = backend.update_many(dataset_ids, job["description"])
+                self.queue.checkpoint(job["job_id"], outcomes, step_stats.summary() if step_stats.samples else None)
+        finally:
+            backend.close()
+
+    def run(self, idle_exit=idle_exit):
+        # Works until the queue has been empty for idle_exit seconds (None: forever)
+        idle_since = time.monotonic()
+        self.queue.beat(self.pid)
+        threading.Thread(target=self.keep_alive, name="job-heartbeat", daemon=True).start()
+        try:
+            while True:
+                job = self.queue.claim(self.pid)
+                if job is not None:
+                    self.current_job = job["job_id"]
+                    self.run_job(job)
+                    self.current_job = None
+                    idle_since = time.monotonic()
+                elif idle_exit is not None and time.monotonic() - idle_since > idle_exit:
+                    break
+                else:
+                    time.sleep(poll_interval)
+        finally:
+            self.stopped.set()
+            for pool in self.pools.values():
+                pool.close()
+            self.queue.retire(self.pid)
+
+
+def start_worker(path, email, password, app_token=None):
+    # Starts a detached worker process; credentials go through its environment, not the job file
+    env = dict(
+        os.environ,
+        SOCRATA_EMAIL=email or "",
+        SOCRATA_PASSWORD=password or "",
+        SOCRATA_APP_TOKEN=app_token or ""
+    )
+    cli = os.path.join(os.path.dirname(os.path.abspath(__file__)), "error_pull_cli.py")
+    with open(f"{path}.log", "a") as log:
+        return subprocess.Popen(
+            [sys.executable, cli, "worker", "--jobs", path],
+            env=env,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            stdin=subprocess.DEVNULL,
+            start_new_session=True
+        )
+
+
+def ensure_worker(queue, email, password, app_token=None):
+    # Starts a worker when jobs are waiting and none is alive; True if one was started
+    if not queue.unfinished():
+        return False
+    marker = queue.reserve_worker()
+    if marker is None:
+        return False
+    try:
+        process = start_worker(queue.path, email, password, app_token)
+    except Exception:
+        queue.retire(marker)
+        raise
+    queue.worker_started(marker, process.pid)
+    return True